@@ -0,0 +1,289 @@
+from nose import with_setup
+from vasp.VaspChargeDensity import VaspChargeDensity
+from ase.build import bulk
+import numpy as np
+import os
+
+
+def setup_func():
+    "set up test fixtures"
+    np.random.seed(0)
+
+
+def teardown_func():
+    "tear down test fixtures"
+    for f in ['CHG', 'CHGCAR']:
+        if os.path.exists(f):
+            os.unlink(f)
+
+
+def make_density(nimages=1, shape=(6, 8, 10)):
+    "a random charge density on a silicon cell"
+    vcd = VaspChargeDensity(None)
+    vcd.atoms = [bulk('Si', 'diamond', 5.43) for i in range(nimages)]
+    vcd.chg = [np.random.rand(*shape) for i in range(nimages)]
+    vcd.aug = ('augmentation occupancies   1   2\n'
+               '  0.1000000E+00  0.2000000E+00\n')
+    return vcd
+
+
+@with_setup(setup_func, teardown_func)
+def test0():
+    "CHG and CHGCAR files are read back in the right order"
+    vcd = make_density(nimages=2)
+    vcd.write('CHG')
+    chg = VaspChargeDensity('CHG')
+    assert len(chg.chg) == 2
+    for a, b in zip(vcd.chg, chg.chg):
+        assert a.shape == b.shape
+        assert abs(a - b).max() < 1e-3
+
+    vcd.write('CHGCAR')
+    chgcar = VaspChargeDensity('CHGCAR')
+    assert len(chgcar.chg) == 1
+    assert abs(chgcar.chg[0] - vcd.chg[-1]).max() < 1e-9
+    assert chgcar.aug == vcd.aug
+
+
+@with_setup(setup_func, teardown_func)
+def test1():
+    "the binary cache is memory-mapped until the file changes"
+    from vasp.vasprc import VASPRC
+    from vasp.volumetric import read_volumetric
+    VASPRC['volumetric.cache'] = True
+    try:
+        make_density().write('CHGCAR')
+        data = read_volumetric('CHGCAR')
+        assert os.path.exists('CHGCAR.npy')
+        cached = read_volumetric('CHGCAR')
+        assert isinstance(cached, np.memmap)
+        assert (cached == data).all()
+
+        make_density().write('CHGCAR')
+        os.utime('CHGCAR', (0, 0))
+        assert not isinstance(read_volumetric('CHGCAR'), np.memmap)
+    finally:
+        VASPRC['volumetric.cache'] = False
+        for f in ['CHGCAR.npy', 'CHGCAR.npy.json']:
+            if os.path.exists(f):
+                os.unlink(f)
+
+
+def test2():
+    "densities are written in rows of 10 (CHG) or 5 (CHGCAR) values"
+    import StringIO
+    chg = np.arange(1, 22, dtype=float).reshape((3, 7, 1), order='F')
+    f = StringIO.StringIO()
+    VaspChargeDensity(None)._write_chg(f, chg, 2.0, 'chgcar')
+    lines = f.getvalue().split('\n')
+    assert len(lines) == 6 and lines[-1] == ''
+    assert lines[0] == ' %17.10E' * 5 % (2, 4, 6, 8, 10)
+    assert lines[4] == ' %17.10E' % 42
+
+    f = StringIO.StringIO()
+    VaspChargeDensity(None)._write_chg(f, chg, 1.0, 'chg')
+    lines = f.getvalue().split('\n')
+    assert [len(line.split()) for line in lines] == [10, 10, 1, 0]
+
+
+@with_setup(setup_func, teardown_func)
+def test3():
+    "selected images and components are read, the rest is skipped"
+    import ase.io.vasp as aiv
+    vcd = make_density(nimages=3)
+    vcd.chgdiff = [chg - 0.5 for chg in vcd.chg]
+    with open('CHG', 'w') as f:
+        for atoms, chg, chgdiff in zip(vcd.atoms, vcd.chg, vcd.chgdiff):
+            aiv.write_vasp(f, atoms, direct=True, long_format=False)
+            for block in [chg, chgdiff]:
+                f.write('\n' + ' %4i' * 3 % chg.shape + '\n')
+                vcd._write_chg(f, block, atoms.get_volume(), 'chg')
+            f.write('\n')
+
+    ref = VaspChargeDensity('CHG')
+    assert len(ref.chg) == 3 and len(ref.chgdiff) == 3
+
+    chg = VaspChargeDensity('CHG', images=[-1], components=['magnetization'])
+    assert len(chg.atoms) == 1 and chg.chg == []
+    assert (chg.chgdiff[0] == ref.chgdiff[-1]).all()
+
+    chg = VaspChargeDensity('CHG', images=[0, 2], components=['total'])
+    assert len(chg.chg) == 2 and chg.chgdiff == []
+    assert (chg.chg[1] == ref.chg[2]).all()
+
+
+@with_setup(setup_func, teardown_func)
+def test4():
+    "grid-free moments match sums over coordinate grids"
+    from vasp.volumetric import grid_moments
+    cell = bulk('Si', 'diamond', 5.43).get_cell()
+    cd = np.random.rand(6, 8, 10)
+    X, Y, Z = np.mgrid[0.0:1.0:1.0 / 6, 0.0:1.0:1.0 / 8, 0.0:1.0:1.0 / 10]
+    real = np.dot(np.column_stack([X.ravel(), Y.ravel(), Z.ravel()]), cell)
+    dV = abs(np.linalg.det(cell)) / cd.size
+    ref = np.dot(cd.ravel(), real) * dV
+
+    total, moment = grid_moments(cd, cell)
+    assert abs(total - cd.sum() * dV) < 1e-10
+    assert abs(moment - ref).max() < 1e-10
+
+
+@with_setup(setup_func, teardown_func)
+def test5():
+    "volumetric files are combined slab by slab"
+    from vasp.volumetric import combine
+    a, b = make_density(), make_density()
+    a.write('CHG', 'chgcar')
+    b.write('CHGCAR')
+    try:
+        for chunk_size in [7, 48, 10000]:
+            combine(['CHG', 'CHGCAR'], [1.0, -2.0], 'CHGCAR_sum',
+                    chunk_size=chunk_size)
+            result = VaspChargeDensity('CHGCAR_sum')
+            assert abs(result.chg[0] - (a.chg[0] - 2 * b.chg[0])).max() < 1e-8
+
+        make_density(shape=(6, 8, 12)).write('CHGCAR')
+        try:
+            combine(['CHG', 'CHGCAR'], [1.0, 1.0], 'CHGCAR_sum')
+            assert False
+        except Exception, e:
+            assert 'grid' in str(e)
+    finally:
+        os.unlink('CHGCAR_sum')
+
+
+@with_setup(setup_func, teardown_func)
+def test6():
+    "planar averages are accumulated slab by slab"
+    from vasp.volumetric import planar_average, macroscopic_average
+    vcd = make_density()
+    vcd.write('CHGCAR')
+    volume = vcd.atoms[0].get_volume()
+    for axis in range(3):
+        others = tuple(i for i in range(3) if i != axis)
+        ref = vcd.chg[0].mean(axis=others) * volume
+        for chunk_size in [1, 100, 10000]:
+            x, average = planar_average('CHGCAR', axis, chunk_size)
+            assert len(x) == len(ref)
+            assert abs(average - ref).max() < 1e-8
+
+    smooth = macroscopic_average(x, average, 2 * (x[1] - x[0]))
+    assert abs(smooth.mean() - average.mean()) < 1e-10
+
+
+@with_setup(setup_func, teardown_func)
+def test7():
+    "float32 and strided grids are made while the file is read"
+    vcd = make_density(shape=(6, 9, 11))
+    vcd.write('CHGCAR')
+    ref = VaspChargeDensity('CHGCAR').chg[0]
+    try:
+        for chunk_size in [2 ** 22, 1, 100]:
+            VaspChargeDensity.chunk_size = chunk_size
+            for stride in [1, 2, 3, 4]:
+                chg = VaspChargeDensity('CHGCAR', dtype=np.float32,
+                                        stride=stride).chg[0]
+                assert chg.dtype == np.float32
+                coarse = ref[::stride, ::stride, ::stride]
+                assert chg.shape == coarse.shape
+                assert abs(chg - coarse).max() < 1e-5
+    finally:
+        VaspChargeDensity.chunk_size = 2 ** 22
+
+
+AUG = '''augmentation occupancies   1   7
+  0.4340340E+00 -0.3045373E-03  0.0000000E+00  0.1234567E+01 -0.9999999E-10
+  0.5000000E+00  0.2500000E+00
+augmentation occupancies   2   3
+  0.1000000E+00  0.2000000E+00 -0.3000000E+00
+'''
+
+
+@with_setup(setup_func, teardown_func)
+def test8():
+    "augmentation occupancies are parsed into arrays when they are used"
+    from vasp.VaspChargeDensity import AugmentationOccupancies
+    aug = AugmentationOccupancies(AUG)
+    assert str(aug) == AUG
+    assert len(aug) == 2
+    assert aug[0].shape == (7,) and aug[1][2] == -0.3
+    assert str(aug) == AUG
+
+    aug[1] *= 2
+    assert aug.values[-1] == -0.6
+    assert str(aug).splitlines()[-1].split()[-1] == '-0.6000000E+00'
+
+    vcd = make_density()
+    vcd.aug = AUG
+    vcd.augmentation.values *= 10
+    vcd.write('CHGCAR')
+    chgcar = VaspChargeDensity('CHGCAR')
+    ref = AugmentationOccupancies(AUG).values * 10
+    assert abs(chgcar.augmentation.values - ref).max() < 1e-10
+    assert chgcar.aug == vcd.aug
+
+
+@with_setup(setup_func, teardown_func)
+def test9():
+    "periodic interpolation of the grid at arbitrary points"
+    vcd = make_density()
+    chg = vcd.chg[0]
+    cell = vcd.atoms[0].get_cell()
+    n = np.array(chg.shape)
+
+    # grid points, given as fractional and Cartesian coordinates
+    ijk = np.array([[0, 0, 0], [1, 2, 3], [5, 7, 9]])
+    for order in [1, 3]:
+        values = vcd.sample(ijk / n.astype(float), scaled=True, order=order)
+        assert abs(values - chg[tuple(ijk.T)]).max() < 1e-8
+        values = vcd.sample(np.dot(ijk / n.astype(float), cell), order=order)
+        assert abs(values - chg[tuple(ijk.T)]).max() < 1e-8
+
+    # the midpoint of an edge across the periodic boundary
+    mid = vcd.sample([[5.5 / 6, 0, 0]], scaled=True)
+    assert abs(mid[0] - (chg[5, 0, 0] + chg[0, 0, 0]) / 2) < 1e-12
+
+    # periodic images of random points
+    points = np.random.rand(100, 3)
+    for order in [1, 3]:
+        assert abs(vcd.sample(points, scaled=True, order=order)
+                   - vcd.sample(points + [1, -2, 3], scaled=True,
+                                order=order)).max() < 1e-8
+
+
+def test10():
+    "coordinate grids are made in the dtype of the data"
+    import shutil
+    import tempfile
+    from vasp import Vasp
+    from vasp.vasprc import VASPRC
+    co2 = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       'premade_calculations', 'co2')
+    mode = VASPRC['mode']
+    VASPRC['mode'] = None
+    root = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(root, 'co2')
+        shutil.copytree(co2, directory)
+        with open(os.path.join(directory, 'POTCAR'), 'w') as f:
+            f.write('  PAW_PBE O 08Apr2002\n   LEXCH  = PE\n'
+                    ' End of Dataset\n'
+                    '  PAW_PBE C 08Apr2002\n   LEXCH  = PE\n'
+                    ' End of Dataset\n')
+        make_density(shape=(6, 8, 10)).write(os.path.join(directory, 'CHG'))
+        calc = Vasp(directory)
+
+        ref = calc.get_volumetric_data()
+        cell = calc.get_atoms().get_cell()
+        assert abs(ref[0][1, 2, 3] - np.dot([1 / 6., 2 / 8., 3 / 10.],
+                                            cell)[0]) < 1e-10
+        for stride in [1, 2]:
+            grids = calc.get_volumetric_data(dtype=np.float32, stride=stride)
+            for r, g in zip(ref[:3], grids[:3]):
+                assert g.dtype == np.float32
+                coarse = r[::stride, ::stride, ::stride]
+                assert g.shape == coarse.shape
+                assert abs(g - coarse).max() < 1e-4
+    finally:
+        shutil.rmtree(root)
+        VASPRC['mode'] = mode
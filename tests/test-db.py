@@ -35,3 +35,158 @@ def test0():
         assert data['parameters']['sigma'] == 0.01
 
     print 'done'
+
+
+def test1():
+    "the DB.db row is read once, and again when DB.db changes"
+    calc = Vasp('vasp')
+    fname = os.path.join('vasp', 'DB.db')
+    atoms = Atoms('CO', positions=[[0, 0, 0], [1.2, 0, 0]], cell=(5, 5, 5))
+    try:
+        assert calc.get_db_row() is None
+        assert calc.get_db('jobid', 'memory') == [None, None]
+
+        with connect(fname) as con:
+            con.write(atoms, key_value_pairs={'jobid': 'job1'},
+                      data={'memory': 2.0})
+        row = calc.get_db_row()
+        assert calc.get_db_row() is row
+        assert calc.get_db('jobid', 'memory') == ['job1', 2.0]
+
+        os.unlink(fname)
+        with connect(fname) as con:
+            con.write(atoms, key_value_pairs={'jobid': 'job12'})
+        assert calc.get_db('jobid') == 'job12'
+    finally:
+        if os.path.exists(fname):
+            os.unlink(fname)
+
+
+def test2():
+    "DB.db is updated in place"
+    from vasp.metadata import write_row
+    calc = Vasp('vasp')
+    fname = os.path.join('vasp', 'DB.db')
+    atoms = Atoms('CO', positions=[[0, 0, 0], [1.2, 0, 0]], cell=(5, 5, 5))
+    try:
+        with connect(fname) as con:
+            con.write(atoms, key_value_pairs={'xc': 'PBE'},
+                      data={'path': 'vasp', 'jobid': 'job1'})
+        inode = os.stat(fname).st_ino
+
+        calc.update_db(data={'memory': 2.0, 'jobid': 'job2'},
+                       delete=['path'])
+        assert (calc.get_db('jobid', 'memory', 'path', 'xc')
+                == ['job2', 2.0, None, 'PBE'])
+        assert os.stat(fname).st_ino == inode
+
+        atoms.positions[1, 0] = 1.3
+        write_row(fname, atoms, {}, {'path': 'co'})
+        with connect(fname) as con:
+            assert con.count() == 1
+            row = con.get(id=1)
+            assert row.positions[1, 0] == 1.3
+            assert row.key_value_pairs == {} and row.data == {'path': 'co'}
+        assert os.stat(fname).st_ino == inode
+    finally:
+        if os.path.exists(fname):
+            os.unlink(fname)
+
+
+def test3():
+    "the json backend keeps the row in DB.json"
+    from vasp.vasprc import VASPRC
+    from vasp.metadata import write_row
+    calc = Vasp('vasp')
+    fname = os.path.join('vasp', 'DB.json')
+    atoms = Atoms('CO', positions=[[0, 0, 0], [1.2, 0, 0]], cell=(5, 5, 5))
+    VASPRC['db.backend'] = 'json'
+    try:
+        write_row(fname, atoms, {'xc': 'PBE'}, {'path': 'vasp'})
+        calc.update_db(data={'jobid': 'job1'})
+        assert not os.path.exists(os.path.join('vasp', 'DB.db'))
+        assert calc.get_db('jobid', 'path', 'xc') == ['job1', 'vasp', 'PBE']
+
+        unique_id = connect(fname).get(id=1).unique_id
+        atoms.positions[1, 0] = 1.3
+        # the temporary file of another writer is left alone
+        with open(fname + '.tmp', 'w') as f:
+            f.write('other')
+        write_row(fname, atoms, {}, {'path': 'co'})
+        with open(fname + '.tmp') as f:
+            assert f.read() == 'other'
+        os.unlink(fname + '.tmp')
+        row = connect(fname).get(id=1)
+        assert row.unique_id == unique_id
+        assert row.positions[1, 0] == 1.3
+        assert calc.get_db('jobid', 'path') == [None, 'co']
+
+        # the temporary files are renamed, with the usual permissions
+        assert [f for f in os.listdir('vasp')
+                if f.endswith('.json')] == ['DB.json']
+        umask = os.umask(0)
+        os.umask(umask)
+        assert os.stat(fname).st_mode & 0777 == 0666 & ~umask
+    finally:
+        VASPRC['db.backend'] = 'sqlite'
+        for f in [fname, fname + '.tmp']:
+            if os.path.exists(f):
+                os.unlink(f)
+
+
+def test4():
+    "the last key and data can be deleted"
+    from vasp.vasprc import VASPRC
+    calc = Vasp('vasp')
+    atoms = Atoms('CO', positions=[[0, 0, 0], [1.2, 0, 0]], cell=(5, 5, 5))
+    for backend, name in [('sqlite', 'DB.db'), ('json', 'DB.json')]:
+        VASPRC['db.backend'] = backend
+        fname = os.path.join('vasp', name)
+        try:
+            with connect(fname) as con:
+                con.write(atoms, key_value_pairs={'xc': 'PBE'},
+                          data={'jobid': 'job1'})
+            calc.update_db(delete=['xc', 'jobid'])
+            row = connect(fname).get(id=1)
+            assert row.key_value_pairs == {}
+            assert not row.get('data')
+            assert calc.get_db('xc', 'jobid') == [None, None]
+        finally:
+            VASPRC['db.backend'] = 'sqlite'
+            if os.path.exists(fname):
+                os.unlink(fname)
+
+
+def test5():
+    "writing the DB drops the memoized state"
+    import shutil
+    import tempfile
+    from ase.io import read
+    from vasp.vasprc import VASPRC
+    mode = VASPRC['mode']
+    VASPRC['mode'] = None
+    d = os.path.join(tempfile.mkdtemp(), 'co2')
+    try:
+        shutil.copytree(os.path.join('premade_calculations', 'co2'), d)
+        with open(os.path.join(d, 'POTCAR'), 'w') as f:
+            f.write('  PAW_PBE O 08Apr2002\n   LEXCH  = PE\n'
+                    ' End of Dataset\n  PAW_PBE C 08Apr2002\n'
+                    '   LEXCH  = PE\n End of Dataset\n')
+        fname = os.path.join(d, 'DB.db')
+        with connect(fname) as con:
+            con.write(read(os.path.join(d, 'vasprun.xml')),
+                      data={'resort': [0, 1, 2]})
+        calc = Vasp(d)
+        calc.get_state()
+        assert os.path.abspath(d) in Vasp._state_cache
+
+        # an update within the mtime resolution of the filesystem
+        st = os.stat(fname)
+        calc.update_db(data={'jobid': 'job123'})
+        os.utime(fname, (st.st_atime, st.st_mtime))
+        assert calc.get_db('jobid') == 'job123'
+        # so the next get_state sees the jobid
+        assert os.path.abspath(d) not in Vasp._state_cache
+    finally:
+        VASPRC['mode'] = mode
+        shutil.rmtree(os.path.dirname(d))
@@ -0,0 +1,106 @@
+from vasp.outcar import OutcarIndex
+import os
+
+OUTCAR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'premade_calculations', 'co2', 'OUTCAR')
+
+
+def test0():
+    "sections are indexed by the offset of their first line"
+    index = OutcarIndex(OUTCAR)
+    assert len(index['iteration']) == 8
+    assert index['beefens'] == []
+
+    line = index.readline(index['elapsed_time'][-1])
+    assert line.split()[-1] == '39.928'
+    line = index.readline(index['memory'][0])
+    assert float(line.split()[-2]) == 90200
+
+
+def test1():
+    "the index does not depend on the chunk size"
+    ref = OutcarIndex(OUTCAR).offsets
+    for chunk_size in [7, 64, 1000]:
+        assert OutcarIndex(OUTCAR, chunk_size).offsets == ref
+
+
+def test2():
+    "completion is detected from the end of the OUTCAR"
+    from vasp.outcar import outcar_finished
+    assert outcar_finished(OUTCAR)
+    assert not outcar_finished('no-such-OUTCAR')
+
+    with open(OUTCAR) as f:
+        text = f.read()
+    with open('OUTCAR.partial', 'w') as f:
+        f.write(text[:-200])
+    try:
+        assert not outcar_finished('OUTCAR.partial')
+    finally:
+        os.unlink('OUTCAR.partial')
+
+
+def test3():
+    "events are read from the lines appended to OUTCAR and OSZICAR"
+    from vasp.follow import Tail, OutcarParser, OszicarParser
+    oszicar = Tail(os.path.join(os.path.dirname(OUTCAR), 'OSZICAR'),
+                   OszicarParser())
+    events = oszicar.read()
+    assert len(events) == 8
+    assert events[-1]['n'] == 8 and events[-1]['step'] == 1
+    assert oszicar.read() == []
+
+    with open(OUTCAR) as f:
+        text = f.read()
+    end = text.index('energy(sigma->0)')
+    tail = Tail('OUTCAR.partial', OutcarParser())
+    try:
+        with open('OUTCAR.partial', 'w') as f:
+            f.write(text[:end])
+        assert tail.read() == []
+
+        with open('OUTCAR.partial', 'a') as f:
+            f.write(text[end:])
+        events = tail.read()
+        assert [e['event'] for e in events] == ['ionic', 'timing']
+        assert abs(events[0]['energy'] - -18.12100762) < 1e-8
+        assert abs(events[0]['max_force'] - 33.739903) < 1e-6
+        assert events[1]['timing']['Elapsed time (sec)'] == 39.928
+    finally:
+        os.unlink('OUTCAR.partial')
+
+
+TIMING = '''
+ General timing and accounting informations for this job:
+ ========================================================
+
+                  Total CPU time used (sec):       13.415
+                            User time (sec):       12.471
+                          System time (sec):        0.944
+                         Elapsed time (sec):       14.371
+                                  Processor: Intel(R) Xeon(R) CPU
+                              Started at (s): 2018.03.21  12:00:01
+                Nodes used:
+
+                   Maximum memory used (kb):      141948.
+                   Average memory used (kb):           0.
+
+                          Minor page faults:        41326
+                          Major page faults:            0
+                 Voluntary context switches:          489
+'''
+
+
+def test4():
+    "lines of the timing block without a number are skipped"
+    from vasp.follow import OutcarParser
+    parser = OutcarParser()
+    events = []
+    for line in TIMING.split('\n'):
+        events += parser.feed(line)
+    assert len(events) == 1
+    timing = events[0]['timing']
+    assert timing['Elapsed time (sec)'] == 14.371
+    assert timing['Maximum memory used (kb)'] == 141948.
+    assert timing['Voluntary context switches'] == 489
+    assert 'Processor' not in timing and 'Nodes used' not in timing
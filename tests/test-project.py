@@ -0,0 +1,87 @@
+from nose import with_setup
+from vasp import Vasp
+from vasp.project import ProjectIndex
+from ase.db import connect
+from ase.io import read
+import os
+import shutil
+import tempfile
+
+CO2 = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   'premade_calculations', 'co2')
+
+TMP = {}
+
+
+def setup_func():
+    "set up test fixtures"
+    TMP['root'] = tempfile.mkdtemp()
+
+
+def teardown_func():
+    "tear down test fixtures"
+    shutil.rmtree(TMP['root'])
+
+
+def make_calc(name, encut):
+    "a copy of the co2 calculation with a DB.db"
+    directory = os.path.join(TMP['root'], name)
+    shutil.copytree(CO2, directory)
+    with open(os.path.join(directory, 'POTCAR'), 'w') as f:
+        f.write('')
+    atoms = read(os.path.join(CO2, 'vasprun.xml'))
+    with connect(os.path.join(directory, 'DB.db')) as con:
+        con.write(atoms, data={'parameters': {'encut': encut, 'xc': 'PBE'},
+                               'resort': [0, 1, 2]})
+    return directory
+
+
+@with_setup(setup_func, teardown_func)
+def test0():
+    "the index is queried without calculators and updated incrementally"
+    a = make_calc('a', 400)
+    b = make_calc(os.path.join('sub', 'b'), 500)
+    index = ProjectIndex(os.path.join(TMP['root'], 'project.db'))
+
+    updated, removed, failed = index.update(TMP['root'])
+    assert sorted(updated) == [a, b] and removed == [] and failed == []
+    assert len(index) == 2
+
+    rows = index.select(state=Vasp.FINISHED, elements=['C', 'O'],
+                        encut=500.0)
+    assert [row['directory'] for row in rows] == [b]
+    ref = read(os.path.join(CO2, 'vasprun.xml'))
+    assert abs(rows[0]['energy'] - ref.get_potential_energy()) < 1e-8
+    assert abs(rows[0]['fmax']
+               - (ref.get_forces() ** 2).sum(axis=1).max() ** 0.5) < 1e-8
+    assert rows[0]['formula'] == ref.get_chemical_formula()
+    assert rows[0]['parameters'] == {'encut': 500, 'xc': 'PBE'}
+    assert index.select(xc='PBE', elements=['Pt']) == []
+
+    # only changed directories are read again
+    assert index.update(TMP['root']) == ([], [], [])
+    with open(os.path.join(a, 'INCAR'), 'a') as f:
+        f.write('\n')
+    assert index.update(TMP['root']) == ([a], [], [])
+
+    shutil.rmtree(b)
+    assert index.update(TMP['root']) == ([], [b], [])
+    assert [row['directory'] for row in index.select()] == [a]
+
+
+@with_setup(setup_func, teardown_func)
+def test1():
+    "directories that cannot be read are dropped from the index"
+    a = make_calc('a', 400)
+    index = ProjectIndex(os.path.join(TMP['root'], 'project.db'))
+    index.update(TMP['root'])
+    assert len(index.select(encut=400)) == 1
+
+    with open(os.path.join(a, 'DB.db'), 'w') as f:
+        f.write('not a database')
+    assert index.update(TMP['root']) == ([], [], [a])
+    assert index.select() == []
+
+    # and are read again once they are fixed
+    os.unlink(os.path.join(a, 'DB.db'))
+    assert index.update(TMP['root']) == ([a], [], [])
@@ -0,0 +1,69 @@
+from vasp.vasprc import VASPRC
+from vasp.summary import summarize_all, format_jsonl, format_tsv, FIELDS
+import json
+import os
+import shutil
+import tempfile
+
+CO2 = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   'premade_calculations', 'co2')
+
+POTCAR = '''  PAW_PBE O 08Apr2002
+   LEXCH  = PE
+ End of Dataset
+  PAW_PBE C 08Apr2002
+   LEXCH  = PE
+ End of Dataset
+'''
+
+
+def test0():
+    "directories are summarized in parallel, and errors are isolated"
+    mode = VASPRC['mode']
+    VASPRC['mode'] = None
+    root = tempfile.mkdtemp()
+    try:
+        dirs = []
+        for name in ['a', 'b', 'c']:
+            dirs.append(os.path.join(root, name))
+            shutil.copytree(CO2, dirs[-1])
+            with open(os.path.join(dirs[-1], 'POTCAR'), 'w') as f:
+                f.write(POTCAR)
+        os.makedirs(os.path.join(root, 'empty'))
+        dirs.insert(1, os.path.join(root, 'empty'))
+
+        records = list(summarize_all(dirs, output=None, jobs=2))
+        assert [r['directory'] for r in records] == dirs
+        assert [r['status'] for r in records] == ['ok', 'error', 'ok', 'ok']
+        assert records[0]['formula'] == 'CO2'
+
+        records = list(summarize_all(dirs, jobs=2, ordered=False))
+        assert sorted(r['directory'] for r in records) == sorted(dirs)
+
+        records = list(summarize_all(dirs[:1], timeout=1e-4))
+        assert records[0]['status'] == 'timeout'
+        records = list(summarize_all(dirs, timeout=1e-4, jobs=2))
+        assert [r['status'] for r in records] == ['timeout'] * 4
+
+        assert json.loads(format_jsonl(records[0])) == records[0]
+        assert len(format_tsv(records[0]).split('\t')) == len(FIELDS)
+    finally:
+        shutil.rmtree(root)
+        VASPRC['mode'] = mode
+
+
+def test1():
+    "a timeout outside of summarize still makes a record"
+    import vasp.summary
+
+    def summarize(*args):
+        raise vasp.summary.Timeout()
+
+    original = vasp.summary.summarize
+    vasp.summary.summarize = summarize
+    try:
+        record = vasp.summary._summarize(('a', None, 1, None))
+    finally:
+        vasp.summary.summarize = original
+    assert record['directory'] == 'a'
+    assert record['status'] == 'timeout'
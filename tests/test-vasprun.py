@@ -0,0 +1,274 @@
+from nose import with_setup
+from vasp import Vasp
+from vasp.vasprc import VASPRC
+from vasp.vasprun import read_eigenvalues
+import os
+import shutil
+
+CO2 = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   'premade_calculations', 'co2')
+
+
+def setup_func():
+    "set up test fixtures"
+    if os.path.exists('vasp/vasprun.xml'):
+        os.unlink('vasp/vasprun.xml')
+
+
+def make_calc():
+    "an empty calculator with the co2 vasprun.xml copied into it"
+    calc = Vasp('vasp')
+    shutil.copy(os.path.join(CO2, 'vasprun.xml'), 'vasp/vasprun.xml')
+    return calc
+
+
+def teardown_func():
+    "tear down test fixtures"
+    for f in ['vasprun.xml', 'vasprun.npz']:
+        if os.path.exists(os.path.join('vasp', f)):
+            os.unlink(os.path.join('vasp', f))
+
+
+@with_setup(setup_func, teardown_func)
+def test0():
+    "vasprun.xml is parsed once and reused"
+    calc = make_calc()
+    tree = calc.get_vasprun()
+    assert tree is calc.get_vasprun()
+
+    efermi = float(tree.find("calculation/dos/i[@name='efermi']").text)
+    assert abs(efermi - -9.00268308) < 1e-8
+
+
+@with_setup(setup_func, teardown_func)
+def test1():
+    "the cache is dropped when vasprun.xml changes"
+    calc = make_calc()
+    tree = calc.get_vasprun()
+
+    with open('vasp/vasprun.xml', 'a') as f:
+        f.write('\n')
+
+    assert tree is not calc.get_vasprun()
+
+
+@with_setup(setup_func, teardown_func)
+def test2():
+    "files over the memory budget are not kept"
+    budget = VASPRC['vasprun.cache_mb']
+    VASPRC['vasprun.cache_mb'] = 0
+    try:
+        calc = make_calc()
+        assert calc.get_vasprun() is not calc.get_vasprun()
+    finally:
+        VASPRC['vasprun.cache_mb'] = budget
+
+
+def test3():
+    "streamed ionic steps match ase.io"
+    from ase.io import read
+    from vasp.vasprun import iter_ionic_steps
+    fname = os.path.join(CO2, 'vasprun.xml')
+    steps = list(iter_ionic_steps(fname))
+    images = read(fname, ':')
+    assert len(steps) == len(images)
+
+    for step, atoms in zip(steps, images):
+        assert step['symbols'] == atoms.get_chemical_symbols()
+        assert abs(step['energy'] - atoms.get_potential_energy()) < 1e-8
+        assert abs(step['forces'] - atoms.get_forces()).max() < 1e-8
+        assert abs(step['stress'] - atoms.get_stress()).max() < 1e-8
+        assert abs(step['scaled_positions']
+                   - atoms.get_scaled_positions()).max() < 1e-8
+
+
+def test4():
+    "a truncated vasprun.xml stops after the last complete step"
+    from vasp.vasprun import iter_ionic_steps
+    with open(os.path.join(CO2, 'vasprun.xml')) as f:
+        text = f.read()
+    if not os.path.isdir('vasp'):
+        os.makedirs('vasp')
+    with open('vasp/vasprun.xml', 'w') as f:
+        f.write(text[:text.index('</calculation>') + 200])
+
+    try:
+        assert len(list(iter_ionic_steps('vasp/vasprun.xml'))) == 1
+    finally:
+        os.unlink('vasp/vasprun.xml')
+
+
+def test5():
+    "bulk eigenvalues and occupations"
+    from xml.etree import ElementTree
+    tree = ElementTree.parse(os.path.join(CO2, 'vasprun.xml'))
+    eigenvalues, occupations = read_eigenvalues(tree)
+    assert eigenvalues.shape == (1, 1, 12)
+    assert occupations.shape == (1, 1, 12)
+    assert eigenvalues[0, 0, 0] == -31.1552
+    assert eigenvalues[0, 0, -1] == 0.7106
+    assert occupations[0, 0].sum() == 8.0
+
+
+PDOS = '''<modeling><calculation><dos><partial><array>
+<field>energy</field><field>s</field><field>py</field><field>pz</field>
+<field>px</field><field>dxy</field><field>dyz</field><field>dz2</field>
+<field>dxz</field><field>x2-y2</field>
+<set>
+<set comment="ion 1"><set comment="spin 1">
+<r> -1.0 1 2 3 4 5 6 7 8 9 </r>
+<r>  1.0 1 2 3 4 5 6 7 8 9 </r>
+</set></set>
+<set comment="ion 2"><set comment="spin 1">
+<r> -1.0 10 20 30 40 50 60 70 80 90 </r>
+<r>  1.0 10 20 30 40 50 60 70 80 90 </r>
+</set></set>
+</set>
+</array></partial></dos></calculation></modeling>'''
+
+
+def test6():
+    "lm-decomposed projected DOS tensor"
+    from xml.etree import ElementTree
+    from vasp.vasprun import read_pdos, orbital_l
+    energies, pdos, orbitals = read_pdos(ElementTree.fromstring(PDOS))
+    assert energies.tolist() == [-1.0, 1.0]
+    assert pdos.shape == (2, 1, 2, 9)
+    assert orbitals[:4] == ['s', 'py', 'pz', 'px']
+    assert [orbital_l(o) for o in orbitals] == list('sppp' + 'd' * 5)
+    assert pdos[1, 0, 0, orbitals.index('x2-y2')] == 90
+
+
+@with_setup(setup_func, teardown_func)
+def test7():
+    "the npz sidecar matches vasprun.xml until it changes"
+    from ase.io import read
+    from vasp.sidecar import sidecar_atoms
+    VASPRC['vasprun.sidecar'] = True
+    try:
+        calc = make_calc()
+        assert calc.read_sidecar() is None
+        calc.write_sidecar(magmoms=[0.0, 0.0, 0.0])
+
+        sidecar = calc.read_sidecar()
+        assert sidecar is not None
+        eigenvalues, occupations = read_eigenvalues(calc.get_vasprun())
+        assert (sidecar['eigenvalues'] == eigenvalues).all()
+        assert float(sidecar['efermi']) == -9.00268308
+
+        atoms = sidecar_atoms(sidecar)
+        ref = read(os.path.join(CO2, 'vasprun.xml'))
+        assert atoms.get_chemical_symbols() == ref.get_chemical_symbols()
+        assert abs(atoms.get_forces() - ref.get_forces()).max() < 1e-8
+        assert abs(atoms.get_potential_energy()
+                   - ref.get_potential_energy()) < 1e-8
+
+        with open('vasp/vasprun.xml', 'a') as f:
+            f.write('\n')
+        assert calc.read_sidecar() is None
+    finally:
+        VASPRC['vasprun.sidecar'] = False
+
+
+def test8():
+    "a growing vasprun.xml is read incrementally"
+    from vasp.vasprun import IncrementalVasprun
+    with open(os.path.join(CO2, 'vasprun.xml')) as f:
+        text = f.read()
+    end = text.index('</calculation>') + len('</calculation>')
+    if not os.path.isdir('vasp'):
+        os.makedirs('vasp')
+
+    try:
+        with open('vasp/vasprun.xml', 'w') as f:
+            f.write(text[:end - 100])
+        reader = IncrementalVasprun('vasp/vasprun.xml')
+        assert reader.update() == []
+
+        with open('vasp/vasprun.xml', 'a') as f:
+            f.write(text[end - 100:end + 50])
+        steps = reader.update()
+        assert len(steps) == 1
+        assert reader.offset == end
+        assert steps[0]['symbols'] == ['O', 'O', 'C']
+        assert abs(steps[0]['forces'][0, 0] - -33.73990311) < 1e-8
+
+        with open('vasp/vasprun.xml', 'a') as f:
+            f.write(text[end + 50:])
+        assert reader.update() == []
+        assert len(reader.steps) == 1
+    finally:
+        os.unlink('vasp/vasprun.xml')
+
+
+def test9():
+    "block offsets are found across chunk boundaries"
+    from vasp.vasprun import scan_blocks
+    fname = os.path.join(CO2, 'vasprun.xml')
+    with open(fname, 'rb') as f:
+        text = f.read()
+        ref = scan_blocks(f, 'calculation')
+        assert len(ref) == 1
+        start, end = ref[0]
+        assert text[start:end].startswith('<calculation>')
+        assert text[start:end].endswith('</calculation>')
+        for chunk_size in [7, 13, 64]:
+            assert scan_blocks(f, 'calculation',
+                               chunk_size=chunk_size) == ref
+
+
+def test10():
+    "lazy trajectories decode frames on demand"
+    from ase.io import read
+    from vasp.vasprun import VasprunTrajectory
+    fname = os.path.join(CO2, 'vasprun.xml')
+    traj = VasprunTrajectory(fname)
+    ref = read(fname, ':')
+    assert len(traj) == len(ref)
+    assert abs(traj[-1].get_potential_energy()
+               - ref[-1].get_potential_energy()) < 1e-8
+    assert len(traj[::2]) == len(ref[::2])
+    assert len(list(traj)) == len(ref)
+
+
+@with_setup(setup_func, teardown_func)
+def test11():
+    "ionic steps are resorted together"
+    from vasp.vasprun import iter_ionic_steps
+    calc = make_calc()
+    ref = list(iter_ionic_steps('vasp/vasprun.xml'))[-1]
+    calc.resort = [2, 0, 1]
+    step = calc.get_ionic_steps()[-1]
+    assert step['symbols'] == ['C', 'O', 'O']
+    assert (step['scaled_positions']
+            == ref['scaled_positions'][[2, 0, 1]]).all()
+    assert (step['forces'] == ref['forces'][[2, 0, 1]]).all()
+
+
+@with_setup(setup_func, teardown_func)
+def test12():
+    "a sidecar that cannot be written, or lacks a key, falls back to xml"
+    VASPRC['vasprun.sidecar'] = True
+    tmp = os.path.join('vasp', 'vasprun.npz.tmp')
+    try:
+        calc = make_calc()
+        # the temporary file cannot be opened
+        os.mkdir(tmp)
+        calc.write_sidecar(magmoms=[0.0, 0.0, 0.0])
+        assert calc.read_sidecar() is None
+        os.rmdir(tmp)
+
+        calc.write_sidecar(magmoms=[0.0, 0.0, 0.0])
+        assert 'pdos' not in calc.read_sidecar()
+        # there are no atoms to update in this calculator
+        calc.update = lambda: None
+        assert calc.get_fermi_level() == -9.00268308
+        try:
+            calc.get_pdos()
+            assert False
+        except Exception, e:
+            assert 'LORBIT' in str(e)
+    finally:
+        VASPRC['vasprun.sidecar'] = False
+        if os.path.isdir(tmp):
+            os.rmdir(tmp)
@@ -1,49 +1,331 @@
+import re
 import numpy as np
 
 
+def write_values(fobj, chunks, format='chg'):
+    """Write the values in chunks in the CHG or CHGCAR layout.
+
+    chunks is an iterable of 1-D arrays, that are written in order as
+    if they were one array. Each chunk is formatted with one call, so
+    the values are never all in memory at once.
+
+    """
+    # CHG format - 10 columns, other formats - 5 columns
+    if format.lower() == 'chg':
+        fmt, ncol = ' %#11.5G', 10
+    else:
+        fmt, ncol = ' %17.10E', 5
+    row = fmt * ncol + '\n'
+
+    # Values that did not fill a row in the previous chunk
+    rest = np.empty(0)
+    for chunk in chunks:
+        values = np.concatenate([rest, chunk])
+        nrows = len(values) // ncol
+        fobj.write(row * nrows % tuple(values[:nrows * ncol]))
+        rest = values[nrows * ncol:]
+
+    # The last row may be shorter. It ends with a newline whatever
+    # format it is.
+    if len(rest) > 0:
+        fobj.write(fmt * len(rest) % tuple(rest) + '\n')
+
+
+def iter_slabs(f, shape, chunk_size=2 ** 20):
+    """Yield the values of a grid in the open file f, a slab at a time.
+
+    f must be at the first value of the grid. Each slab is a 1-D array
+    of the values in as many whole xy planes as fit in about
+    chunk_size values, in the order of the file (x fastest).
+
+    """
+    nxy = shape[0] * shape[1]
+    nplanes = max(1, chunk_size // nxy)
+    for zz in range(0, shape[2], nplanes):
+        count = nxy * min(nplanes, shape[2] - zz)
+        values = np.fromfile(f, count=count, sep=' ')
+        if values.size != count:
+            raise IOError('Expected {} values in the charge block, '
+                          'found {}.'.format(count, values.size))
+        yield values
+
+
+def fortran_e(x, digits=7):
+    """Return x in the Fortran E format, e.g. 0.4340340E+00."""
+    mantissa, exponent = ('%.*E' % (digits - 1, x)).split('E')
+    sign = '-' if mantissa.startswith('-') else ''
+    exponent = int(exponent) + 1 if x != 0 else 0
+    return '{}0.{}E{:+03d}'.format(sign,
+                                   mantissa.lstrip('-').replace('.', ''),
+                                   exponent)
+
+
+class AugmentationOccupancies(object):
+    """PAW augmentation occupancies from a CHGCAR.
+
+    They are kept as the text from the file until they are used. Then
+    they are parsed into one flat array, values, and aug[i] is the
+    array of the i-th atom, a view into values. Both can be changed in
+    place, e.g. aug.values *= 2 to scale them all.
+
+    str(aug) is the text for a CHGCAR, which is the text that was read
+    if the occupancies were never used.
+
+    """
+    header = re.compile('^(augmentation occupancies.*\n)', re.M)
+
+    def __init__(self, text=''):
+        self.text = text
+        self._values = None
+
+    def _parse(self):
+        """Parse the text into values, offsets and the format."""
+        # ['', header 1, values 1, header 2, values 2, ...]
+        parts = self.header.split(self.text)
+        self.prefix = parts[0]
+        self.headers = parts[1::2]
+        blocks = parts[2::2]
+        sizes = [int(h.split()[-1]) for h in self.headers]
+        self.offsets = np.cumsum([0] + sizes)
+        self._values = np.fromstring(''.join(blocks), sep=' ')
+        if len(self._values) != self.offsets[-1]:
+            raise IOError('Expected {} augmentation occupancies, found {}.'
+                          .format(self.offsets[-1], len(self._values)))
+
+        # the width and digits of the values, and how many on a line,
+        # so they are written back the way they were read.
+        self.ncol, self.width, self.digits = 5, 15, 7
+        for block in blocks:
+            line = block.split('\n')[0]
+            if line.split():
+                self.ncol = len(line.split())
+                self.width = len(line) // self.ncol
+                self.digits = len(line.split()[0].split('E')[0].split('.')[1])
+                break
+
+    @property
+    def values(self):
+        """All the occupancies in one array."""
+        if self._values is None:
+            self._parse()
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self.values[...] = values
+
+    def __len__(self):
+        self.values
+        return len(self.headers)
+
+    def __getitem__(self, i):
+        values = self.values
+        return values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __setitem__(self, i, values):
+        self[i][...] = values
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __str__(self):
+        if self._values is None:
+            return self.text
+
+        lines = [self.prefix]
+        for i, header in enumerate(self.headers):
+            lines.append(header)
+            values = [fortran_e(x, self.digits).rjust(self.width)
+                      for x in self[i]]
+            for j in range(0, len(values), self.ncol):
+                lines.append(''.join(values[j:j + self.ncol]) + '\n')
+        return ''.join(lines)
+
+
 class VaspChargeDensity(object):
-    """Class for representing VASP charge density"""
+    """Class for representing VASP charge density
+
+    dtype is the type of the arrays, e.g. np.float32 for half the
+    memory. With stride > 1 only every stride-th point along each axis
+    is kept, i.e. the point i of an axis with N points in the file is
+    at the fractional coordinate i * stride / N. Both are applied while
+    the file is read, so the full grid is never in memory.
+    """
 
-    def __init__(self, filename='CHG'):
+    # About how many values are parsed at once
+    chunk_size = 2 ** 22
+
+    def __init__(self, filename='CHG', images=None, components=None,
+                 dtype=float, stride=1):
         # Instance variables
         self.atoms = []   # List of Atoms objects
         self.chg = []     # Charge density
         self.chgdiff = []  # Charge density difference, if spin polarized
-        self.aug = ''     # Augmentation charges, not parsed just a big string
+        self.aug = ''     # Augmentation charges, see AugmentationOccupancies
         self.augdiff = ''  # Augmentation charge differece, is spin polarized
+        self.dtype = dtype
+        self.stride = stride
 
         # Note that the augmentation charge is not a list, since they
         # are needed only for CHGCAR files which store only a single
         # image.
         if filename is not None:
-            self.read(filename)
+            self.read(filename, images, components, dtype, stride)
+
+    @property
+    def aug(self):
+        """The augmentation occupancies as text.
+
+        Use self.augmentation for the parsed occupancies.
+        """
+        return str(self.augmentation)
+
+    @aug.setter
+    def aug(self, text):
+        self.augmentation = AugmentationOccupancies(text)
+
+    @property
+    def augdiff(self):
+        """The augmentation occupancy differences as text.
+
+        Use self.augmentation_diff for the parsed occupancies.
+        """
+        return str(self.augmentation_diff)
+
+    @augdiff.setter
+    def augdiff(self, text):
+        self.augmentation_diff = AugmentationOccupancies(text)
 
     def is_spin_polarized(self):
         if len(self.chgdiff) > 0:
             return True
         return False
 
-    def _read_chg(self, fobj, chg, volume):
+    def sample(self, points, index=-1, component='total', scaled=False,
+               order=1):
+        """Return the grid values interpolated at points.
+
+        points is an (M, 3) array of Cartesian coordinates in Angstrom,
+        or of fractional coordinates if scaled is True. The grid is
+        periodic in the cell of self.atoms[index], so points outside
+        the cell are wrapped back into it. The grid point (i, j, k) is
+        at the fractional coordinates (i/n0, j/n1, k/n2), also for
+        grids read with stride > 1.
+
+        component is 'total' for chg, or 'magnetization' for chgdiff.
+        order=1 is trilinear interpolation. order=3 is a periodic cubic
+        B-spline, which needs scipy and a copy of the grid.
+
+        Points are interpolated a batch at a time, so large M does not
+        need large temporary arrays.
+        """
+        grid = (self.chgdiff if component == 'magnetization'
+                else self.chg)[index]
+        shape = np.array(grid.shape)
+
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        if not scaled:
+            cell = self.atoms[index].get_cell()
+            points = np.linalg.solve(np.transpose(cell), points.T).T
+        # grid coordinates in [0, n)
+        g = np.mod(points * shape, shape)
+
+        values = np.empty(len(g))
+        if order == 1:
+            for start in range(0, len(g), self.chunk_size // 8):
+                gs = g[start:start + self.chunk_size // 8]
+                i0 = np.floor(gs).astype(int)
+                t = gs - i0
+                i0 %= shape
+                i1 = (i0 + 1) % shape
+                v = 0
+                # the 8 corners of the voxel around each point
+                for corner in np.ndindex(2, 2, 2):
+                    idx = [np.where(c, i1[:, a], i0[:, a])
+                           for a, c in enumerate(corner)]
+                    w = np.prod([t[:, a] if c else 1 - t[:, a]
+                                 for a, c in enumerate(corner)], axis=0)
+                    v = v + w * grid[idx[0], idx[1], idx[2]]
+                values[start:start + len(gs)] = v
+        elif order == 3:
+            from scipy.ndimage import spline_filter, map_coordinates
+            # The spline coefficients of a periodic grid are those of a
+            # wrapped-padded grid, away from the edges of the padding.
+            pad = 16
+            coeffs = spline_filter(np.pad(grid, pad, mode='wrap'), order=3)
+            for start in range(0, len(g), self.chunk_size // 8):
+                gs = g[start:start + self.chunk_size // 8] + pad
+                values[start:start + len(gs)] = map_coordinates(
+                    coeffs, gs.T, order=3, prefilter=False)
+        else:
+            raise Exception('order must be 1 or 3, not {}.'.format(order))
+        return values
+
+    def _read_chg(self, fobj, chg, volume, shape=None, stride=1):
         """Read charge from file object
 
         Utility method for reading the actual charge density (or
         charge density difference) from a file object. On input, the
         file object must be at the beginning of the charge block, on
         output the file position will be left at the end of the
-        block. The chg array must be of the correct dimensions.
+        block. shape is the grid in the file, and by default the
+        shape of chg. The chg array must be of the correct dimensions,
+        i.e. shape with only every stride-th point.
 
         """
         # VASP writes charge density as
         # WRITE(IU,FORM) (((C(NX,NY,NZ),NX=1,NGXC),NY=1,NGYZ),NZ=1,NGZC)
         # Fortran nested implied do loops; innermost index fastest
-        # First, just read it in
-        for zz in range(chg.shape[2]):
-            for yy in range(chg.shape[1]):
-                chg[:, yy, zz] = np.fromfile(fobj, count=chg.shape[0],
-                                             sep=' ')
+        # so slabs of xy planes are read at once and reshaped in
+        # Fortran order.
+        if shape is None:
+            shape = chg.shape
+        zz = 0
+        for values in iter_slabs(fobj, shape, self.chunk_size):
+            slab = values.reshape((shape[0], shape[1], -1), order='F')
+            # the planes in this slab we keep
+            first = -zz % stride
+            planes = slab[::stride, ::stride, first::stride]
+            chg[:, :, (zz + first) // stride:
+                (zz + first) // stride + planes.shape[2]] = planes
+            zz += slab.shape[2]
         chg /= volume
 
-    def read(self, filename='CHG'):
+    def _skip_chg(self, fobj, size):
+        """Move the file position past a charge block without parsing it.
+
+        size is the number of values in the block. The file position
+        is left where _read_chg would leave it. VASP writes lines of
+        fixed width, so we seek over the full lines and check that we
+        land at the start of the last one. Otherwise the lines are read
+        one at a time.
+
+        """
+        start = fobj.tell()
+        first = fobj.readline()
+        ncol = len(first.split())
+        nlines = -(-size // ncol)
+        nlast = size - (nlines - 1) * ncol
+
+        if nlines > 1:
+            fobj.seek(start + (nlines - 1) * len(first) - 1)
+            if (fobj.read(1) != '\n'
+                or len(fobj.readline().split()) != nlast):
+                fobj.seek(start + len(first))
+                for i in range(nlines - 1):
+                    fobj.readline()
+
+        # np.fromfile also reads the whitespace after the last value
+        while True:
+            fl = fobj.tell()
+            c = fobj.read(1)
+            if not c.isspace():
+                fobj.seek(fl)
+                break
+
+    def read(self, filename='CHG', images=None, components=None,
+             dtype=float, stride=1):
         """Read CHG or CHGCAR file.
 
         If CHG contains charge density from multiple steps all the
@@ -55,18 +337,47 @@ class VaspChargeDensity(object):
         spin-polarized calculation.
 
         aug is the PAW augmentation charges found in CHGCAR. These are
-        not parsed, they are just stored as a string so that they can
-        be written again to a CHGCAR format file.
+        stored as a string so that they can be written again to a
+        CHGCAR format file. augmentation is the same data, parsed into
+        arrays when it is used. See AugmentationOccupancies.
+
+        images is a list of the steps to read, where negative indices
+        count from the end. The steps are stored in the order of the
+        file. components is a list of 'total' (chg) and
+        'magnetization' (chgdiff). The default is to read everything.
+        Blocks that are not needed are skipped without parsing them.
+
+        dtype and stride are described in the class documentation.
 
         """
+        self.dtype = dtype
+        self.stride = stride
+        if components is None:
+            components = ['total', 'magnetization']
 
-        import ase.io.vasp as aiv
         f = open(filename)
+        if images is not None and min(list(images) + [0]) < 0:
+            # we need the number of steps for negative indices
+            nimages = self._read_blocks(f, [], [])
+            images = [i + nimages if i < 0 else i for i in images]
+            f.seek(0)
+
+        self._read_blocks(f, images, components)
+        f.close()
+
+    def _read_blocks(self, f, images, components):
+        """Read the images and components in the open file f.
+
+        See read. Returns the number of steps in the file.
+
+        """
+        import ase.io.vasp as aiv
         self.atoms = []
         self.chg = []
         self.chgdiff = []
         self.aug = ''
         self.augdiff = ''
+        n = 0
         while True:
             try:
                 atoms = aiv.read_vasp(f)
@@ -74,13 +385,17 @@ class VaspChargeDensity(object):
                 # Probably an empty line, or we tried to read the
                 # augmentation occupancies in CHGCAR
                 break
+            selected = images is None or n in images
+            n += 1
             f.readline()
             ngr = f.readline().split()
             ng = (int(ngr[0]), int(ngr[1]), int(ngr[2]))
-            chg = np.empty(ng)
-            self._read_chg(f, chg, atoms.get_volume())
-            self.chg.append(chg)
-            self.atoms.append(atoms)
+            if selected and 'total' in components:
+                self.chg.append(self._read_grid(f, ng, atoms.get_volume()))
+            else:
+                self._skip_chg(f, np.prod(ng))
+            if selected:
+                self.atoms.append(atoms)
             # Check if the file has a spin-polarized charge density part, and
             # if so, read it in.
             fl = f.tell()
@@ -90,83 +405,71 @@ class VaspChargeDensity(object):
             if line1 == '':
                 break
             elif line1.find('augmentation') != -1:
-                augs = [line1]
+                # the occupancies are read as one string when we know
+                # where they end.
+                start = fl
                 while True:
+                    end = f.tell()
                     line2 = f.readline()
                     if line2.split() == ngr:
-                        self.aug = ''.join(augs)
-                        augs = []
-                        chgdiff = np.empty(ng)
-                        self._read_chg(f, chgdiff, atoms.get_volume())
-                        self.chgdiff.append(chgdiff)
+                        self.aug = self._read_text(f, start, end)
+                        self._read_chgdiff(f, ng, atoms, selected,
+                                           components)
+                        start = f.tell()
                     elif line2 == '':
                         break
-                    else:
-                        augs.append(line2)
-                if len(self.aug) == 0:
-                    self.aug = ''.join(augs)
-                    augs = []
+                if len(self.augmentation.text) == 0:
+                    self.aug = self._read_text(f, start, end)
                 else:
-                    self.augdiff = ''.join(augs)
-                    augs = []
+                    self.augdiff = self._read_text(f, start, end)
             elif line1.split() == ngr:
-                chgdiff = np.empty(ng)
-                self._read_chg(f, chgdiff, atoms.get_volume())
-                self.chgdiff.append(chgdiff)
+                self._read_chgdiff(f, ng, atoms, selected, components)
             else:
                 f.seek(fl)
-        f.close()
+        return n
+
+    def _read_text(self, f, start, end):
+        """Return the text of f from start to end.
+
+        The file position is not changed.
+        """
+        fl = f.tell()
+        f.seek(start)
+        text = f.read(end - start)
+        f.seek(fl)
+        return text
+
+    def _read_grid(self, f, ng, volume):
+        """Return the grid of shape ng at the position of f.
+
+        The grid has self.dtype and only every self.stride-th point.
+        """
+        chg = np.empty([-(-n // self.stride) for n in ng], dtype=self.dtype)
+        self._read_chg(f, chg, volume, ng, self.stride)
+        return chg
+
+    def _read_chgdiff(self, f, ng, atoms, selected, components):
+        """Read or skip a charge density difference block."""
+        if selected and 'magnetization' in components:
+            self.chgdiff.append(self._read_grid(f, ng, atoms.get_volume()))
+        else:
+            self._skip_chg(f, np.prod(ng))
 
     def _write_chg(self, fobj, chg, volume, format='chg'):
         """Write charge density
 
         Utility function similar to _read_chg but for writing.
 
+        The values are formatted one z slice at a time, so the whole
+        grid is never copied or turned into a tuple.
+
         """
-        # Make a 1D copy of chg, must take transpose to get ordering right
-        chgtmp = chg.T.ravel()
-        # Multiply by volume
-        chgtmp = chgtmp * volume
-        # Must be a tuple to pass to string conversion
-        chgtmp = tuple(chgtmp)
-        # CHG format - 10 columns
-        if format.lower() == 'chg':
-            # Write all but the last row
-            for ii in range((len(chgtmp) - 1) // 10):
-                fobj.write(' %#11.5G %#11.5G %#11.5G %#11.5G %#11.5G\
- %#11.5G %#11.5G %#11.5G %#11.5G %#11.5G\n' % chgtmp[ii * 10:(ii + 1) * 10]
-                           )
-            # If the last row contains 10 values then write them without a
-            # newline
-            if len(chgtmp) % 10 == 0:
-                fobj.write(' %#11.5G %#11.5G %#11.5G %#11.5G %#11.5G'
-                           ' %#11.5G %#11.5G %#11.5G %#11.5G %#11.5G' %
-                           chgtmp[len(chgtmp) - 10:len(chgtmp)])
-            # Otherwise write fewer columns without a newline
-            else:
-                for ii in range(len(chgtmp) % 10):
-                    fobj.write((' %#11.5G')
-                               % chgtmp[len(chgtmp) - len(chgtmp) % 10 + ii])
-        # Other formats - 5 columns
-        else:
-            # Write all but the last row
-            for ii in range((len(chgtmp) - 1) // 5):
-                fobj.write(' %17.10E %17.10E %17.10E %17.10E %17.10E\n'
-                           % chgtmp[ii * 5:(ii + 1) * 5])
-            # If the last row contains 5 values then write them without a
-            # newline
-            if len(chgtmp) % 5 == 0:
-                fobj.write(' %17.10E %17.10E %17.10E %17.10E %17.10E'
-                           % chgtmp[len(chgtmp) - 5:len(chgtmp)])
-            # Otherwise write fewer columns without a newline
-            else:
-                for ii in range(len(chgtmp) % 5):
-                    fobj.write((' %17.10E')
-                               % chgtmp[len(chgtmp) - len(chgtmp) % 5 + ii])
-        # Write a newline whatever format it is
-        fobj.write('\n')
-        # Clean up
-        del chgtmp
+        # must take transpose to get ordering right, and multiply by
+        # volume
+        write_values(fobj,
+                     (chg[:, :, zz].T.ravel() * volume
+                      for zz in range(chg.shape[2])),
+                     format)
 
     def write(self, filename='CHG', format=None):
         """Write VASP charge density in CHG format.
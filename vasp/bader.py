@@ -8,19 +8,16 @@ from monkeypatch import monkeypatch_class
 
 @monkeypatch_class(vasp.Vasp)
 def chgsum(self):
-    """Uses the chgsum.pl utility to sum over the AECCAR0 and AECCAR2 files."""
-    cwd = os.getcwd()
-    try:
-        os.chdir(self.directory)
-        cmdlist = ['chgsum.pl',
-                   'AECCAR0',
-                   'AECCAR2']
-        p = Popen(cmdlist, stdin=PIPE, stdout=PIPE, stderr=PIPE)
-        out, err = p.communicate()
-        if out == '' or err != '':
-            raise Exception('Cannot perform chgsum:\n\n{0}'.format(err))
-    finally:
-        os.chdir(cwd)
+    """Sum the AECCAR0 and AECCAR2 files into CHGCAR_sum.
+
+    This does what the chgsum.pl utility does, one slab of the grids at
+    a time.
+    """
+    from volumetric import combine
+    combine([os.path.join(self.directory, 'AECCAR0'),
+             os.path.join(self.directory, 'AECCAR2')],
+            [1.0, 1.0],
+            os.path.join(self.directory, 'CHGCAR_sum'))
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -30,7 +27,7 @@ def bader(self, cmd=None, ref=False, verbose=False, overwrite=False):
     Does not overwrite existing files if overwrite=False
     If ref = True, tries to reference the charge density to
     the sum of AECCAR0 and AECCAR2
-    Requires the bader.pl (and chgsum.pl) script to be in the system PATH
+    Requires the bader program to be in the system PATH
     """
     cwd = os.getcwd()
     try:
@@ -1,5 +1,4 @@
 """Module to get elastic moduli from Vasp calculations."""
-import os
 import vasp
 import numpy as np
 from monkeypatch import monkeypatch_class
@@ -26,15 +25,10 @@ def get_elastic_moduli(self):
 
     self.update()
 
-    with open(os.path.join(self.directory, 'OUTCAR')) as f:
-        lines = f.readlines()
+    index = self.get_outcar_index()
 
     TEM = []
-    for i, line in enumerate(lines):
-        if line.startswith(' TOTAL ELASTIC MODULI (kBar)'):
-            j = i + 3
-            data = lines[j: j + 6]
-            break
+    data = index.readlines(index['elastic_moduli'][0], 9)[3:9]
 
     for line in data:
         # each line looks like this:
@@ -0,0 +1,243 @@
+"""Follow the OUTCAR and OSZICAR of a running calculation.
+
+calc.follow() is a generator of events, each a dictionary with an
+'event' key:
+
+electronic
+    one electronic step from OSZICAR, with the ionic 'step', the
+    electronic step 'n', the 'algorithm' (e.g. DAV or RMM), the
+    'energy', 'dE', 'deps', 'ncg' and 'rms'.
+
+ionic
+    one ionic step from OUTCAR, with the 'step', 'energy' (sigma->0),
+    'free_energy', 'forces', 'max_force' and 'stress'. The stress is
+    in eV/A^3 in Voigt order like ase, or None when it was not
+    computed. The forces are in VASP order.
+
+timing
+    the timing footer at the end of the OUTCAR, as a dictionary of the
+    values in 'timing'. It is the last event.
+
+Only the bytes appended since the last read are read. Between reads
+we wait for a change in the directory with inotify when inotify_simple
+or pyinotify is installed, and otherwise sleep.
+
+"""
+
+import os
+import time
+import numpy as np
+from ase.units import GPa
+
+import vasp
+from vasp import log
+from monkeypatch import monkeypatch_class
+
+
+class Tail(object):
+    """Read the lines appended to fname and feed them to parser.
+
+    parser needs a feed(line) method that returns a list of events, and
+    a reset() method. If the file gets shorter, e.g. because the
+    calculation was restarted, it is read again from the start.
+
+    """
+    def __init__(self, fname, parser, chunk_size=2 ** 24):
+        self.fname = fname
+        self.chunk_size = chunk_size
+        self.parser = parser
+        self.offset = 0
+        self.rest = ''
+
+    def read(self):
+        """Return the events in the complete lines appended to the file."""
+        if not os.path.exists(self.fname):
+            return []
+
+        if os.path.getsize(self.fname) < self.offset:
+            log.debug('{} was truncated.'.format(self.fname))
+            self.offset, self.rest = 0, ''
+            self.parser.reset()
+
+        events = []
+        with open(self.fname, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                self.offset += len(data)
+
+                # an incomplete last line waits for the next read.
+                lines = (self.rest + data).split('\n')
+                self.rest = lines.pop()
+                for line in lines:
+                    events += self.parser.feed(line)
+        return events
+
+
+class OszicarParser(object):
+    """Electronic steps in OSZICAR lines."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.step = 1
+
+    def feed(self, line):
+        fields = line.split()
+
+        # the ionic step summary, e.g.
+        #    1 F= -.18117142E+02 E0= -.18121008E+02  d E =0.115958E-01
+        if 'F=' in fields:
+            self.step += 1
+            return []
+
+        # DAV:   1     0.111548699131E+03    0.11155E+03 ...
+        if len(fields) >= 7 and fields[0].endswith(':'):
+            return [{'event': 'electronic',
+                     'step': self.step,
+                     'algorithm': fields[0][:-1],
+                     'n': int(fields[1]),
+                     'energy': float(fields[2]),
+                     'dE': float(fields[3]),
+                     'deps': float(fields[4]),
+                     'ncg': int(fields[5]),
+                     'rms': float(fields[6])}]
+        return []
+
+
+class OutcarParser(object):
+    """Ionic steps and the timing footer in OUTCAR lines."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.step = 0
+        self.stress = None
+        self.forces = None
+        self.free_energy = None
+        self.section = None
+        self.timing = {}
+
+    def feed(self, line):
+        if self.section == 'forces':
+            if line.startswith(' ----'):
+                if self.forces:
+                    self.section = None
+            else:
+                self.forces.append([float(x) for x in line.split()[3:6]])
+            return []
+
+        if line.startswith('  in kB'):
+            # XX YY ZZ XY YZ ZX to ase's xx yy zz yz xz xy
+            stress = np.array([float(x) for x in line.split()[2:8]])
+            self.stress = -stress[[0, 1, 2, 4, 5, 3]] * 1e-1 * GPa
+        elif 'TOTAL-FORCE' in line:
+            self.section = 'forces'
+            self.forces = []
+        elif 'FREE ENERGIE OF THE ION-ELECTRON SYSTEM' in line:
+            self.section = 'energy'
+        elif self.section == 'energy' and 'TOTEN' in line:
+            self.free_energy = float(line.split()[-2])
+        elif self.section == 'energy' and 'energy(sigma->0)' in line:
+            self.section = None
+            self.step += 1
+            forces = np.array(self.forces)
+            event = {'event': 'ionic',
+                     'step': self.step,
+                     'energy': float(line.split()[-1]),
+                     'free_energy': self.free_energy,
+                     'forces': forces,
+                     'max_force': (np.sqrt((forces ** 2).sum(axis=1)).max()
+                                   if len(forces) else None),
+                     'stress': self.stress}
+            self.stress, self.forces = None, None
+            return [event]
+        elif 'General timing and accounting' in line:
+            self.section = 'timing'
+        elif self.section == 'timing' and ':' in line:
+            key, value = line.split(':', 1)
+            # only the lines with a number are kept
+            try:
+                self.timing[key.strip()] = float(value.split()[0])
+            except (ValueError, IndexError):
+                pass
+            if 'Voluntary context switches' in line:
+                self.section = None
+                return [{'event': 'timing', 'timing': self.timing}]
+        return []
+
+
+class Watcher(object):
+    """Wait for files in directory to change.
+
+    inotify_simple or pyinotify are used when they are installed, and
+    we sleep otherwise. inotify does not see writes from other hosts on
+    network file systems, so wait always returns after timeout seconds.
+
+    """
+    def __init__(self, directory):
+        self.close = lambda: None
+        try:
+            from inotify_simple import INotify, flags
+            inotify = INotify()
+            inotify.add_watch(directory, flags.MODIFY | flags.CREATE)
+            self.wait = lambda timeout: inotify.read(timeout=timeout * 1000)
+            self.close = inotify.close
+            return
+        except ImportError:
+            pass
+
+        try:
+            import pyinotify
+            wm = pyinotify.WatchManager()
+            wm.add_watch(directory, pyinotify.IN_MODIFY | pyinotify.IN_CREATE)
+            notifier = pyinotify.Notifier(wm)
+
+            def wait(timeout):
+                if notifier.check_events(timeout * 1000):
+                    notifier.read_events()
+                    notifier.process_events()
+            self.wait = wait
+            self.close = notifier.stop
+            return
+        except ImportError:
+            pass
+
+        self.wait = time.sleep
+
+
+@monkeypatch_class(vasp.Vasp)
+def follow(self, poll_interval=5, timeout=None):
+    """Yield events from the OUTCAR and OSZICAR of this calculation.
+
+    See the module documentation for the events. Events already in the
+    files are yielded first, so this also works for finished
+    calculations. Stops after the timing event, or when timeout seconds
+    have passed.
+
+    for event in calc.follow():
+        if event['event'] == 'ionic':
+            print event['step'], event['energy'], event['max_force']
+
+    """
+    tails = [Tail(os.path.join(self.directory, 'OSZICAR'), OszicarParser()),
+             Tail(self.outcar, OutcarParser())]
+    watcher = Watcher(self.directory)
+    t0 = time.time()
+    try:
+        while True:
+            done = False
+            for tail in tails:
+                for event in tail.read():
+                    done = done or event['event'] == 'timing'
+                    yield event
+            if done:
+                return
+
+            if timeout is not None and time.time() - t0 > timeout:
+                return
+            watcher.wait(poll_interval)
+    finally:
+        watcher.close()
@@ -4,36 +4,59 @@ from hashlib import sha1
 import warnings
 
 import numpy as np
-from xml.etree import ElementTree
 import vasp
 from vasp import log
 from monkeypatch import monkeypatch_class
+from outcar import read_tail
+from metadata import db_file, get_row
+from vasprun import (file_key, varray_to_array, read_eigenvalues,
+                     read_total_dos, read_pdos, orbital_l)
 
 
 @monkeypatch_class(vasp.Vasp)
-def get_db(self, *keys):
-    """Retrieve values for each key in keys.
+def get_db_row(self):
+    """Return row 1 of DB.db, or None if there is no row.
 
-    First look for key/value, then in data.
+    The decoded row is kept on the calculator with the (path, size,
+    mtime) of DB.db, so DB.db is opened again only when it changes.
+    The row is read from DB.json instead with the json backend, see
+    `metadata`.
+    Use row.toatoms() for the atoms, and row.key_value_pairs and
+    row.data for the rest.
 
     """
-    dbfile = os.path.join(self.directory, 'DB.db')
+    dbfile = db_file(self.directory)
+    key = file_key(dbfile)
 
-    if not os.path.exists(dbfile):
-        return [None for key in keys] if len(keys) > 1 else None
+    cache = getattr(self, '_db_row', None)
+    if key is None:
+        self._db_row = None
+        return None
+    elif cache is not None and cache[0] == key:
+        return cache[1]
 
-    vals = [None for key in keys]
+    log.debug('Reading {}'.format(dbfile))
     from ase.db import connect
-
     with connect(dbfile) as con:
-        try:
-            at = con.get(id=1)
-            for i, key in enumerate(keys):
-                vals[i] = (at.key_value_pairs.get(key, None)
-                           or at.data.get(key, None))
-        except KeyError, e:
-            if e.message == 'no match':
-                pass
+        row = get_row(con)
+    self._db_row = (key, row)
+    return row
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_db(self, *keys):
+    """Retrieve values for each key in keys.
+
+    First look for key/value, then in data. The values come from the
+    cached row of `get_db_row`.
+
+    """
+    vals = [None for key in keys]
+    row = self.get_db_row()
+    if row is not None:
+        for i, key in enumerate(keys):
+            vals[i] = (row.key_value_pairs.get(key, None)
+                       or row.get('data', {}).get(key, None))
     return vals if len(vals) > 1 else vals[0]
 
 
@@ -51,14 +74,13 @@ def get_beefens(self, n=-1):
     see http://suncat.slac.stanford.edu/facility/software/functional/
     """
     self.update()
-    beefens = []
-    with open(os.path.join(self.directory, 'OUTCAR')) as f:
-        lines = f.readlines()
-        for i, line in enumerate(lines):
-            if 'BEEFens' in line:
-                nsamples = int(re.search('(\d+)', line).groups()[0])
-                beefens.append([float(x) for x in lines[i + 1: i + nsamples]])
-    return np.array(beefens[n])
+    index = self.get_outcar_index()
+    # only the section we want is read.
+    offset = index['beefens'][n]
+    line = index.readline(offset)
+    nsamples = int(re.search('(\d+)', line).groups()[0])
+    lines = index.readlines(offset, nsamples)
+    return np.array([float(x) for x in lines[1:]])
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -71,15 +93,17 @@ def get_ibz_k_points(self, cartesian=True):
     """
     self.update()
 
-    with open(os.path.join(self.directory,
-                           'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
+    sidecar = self.read_sidecar()
+    if sidecar is not None:
+        kpts = sidecar['kpoints']
+    else:
+        tree = self.get_vasprun()
         # each weight is in a <v>w</v> element in this varray
         kpts = np.array([[float(y) for y in x.text.split()] for x in
                          tree.find("kpoints/varray[@name='kpointlist']")])
-        if cartesian:
-            kpts = np.dot(kpts, np.linalg.inv(self.atoms.cell).T)
-        return kpts
+    if cartesian:
+        kpts = np.dot(kpts, np.linalg.inv(self.atoms.cell).T)
+    return kpts
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -94,19 +118,20 @@ def get_occupation_numbers(self, kpt=0, spin=0):
     """
     self.update()
 
-    with open(os.path.join(self.directory,
-                           'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
-        path = '/'.join(['calculation',
-                         'eigenvalues',
-                         'array',
-                         'set',
-                         "set[@comment='spin {}']".format(spin + 1),
-                         "set[@comment='kpoint {}']".format(kpt + 1)])
-        # these are all in elements like this.
-        # <r>   -3.8965    1.0000 </r>
-        return np.array([float(x.text.split()[1]) for x
-                         in tree.find(path)])
+    sidecar = self.read_sidecar()
+    if sidecar is not None and 'occupations' in sidecar:
+        return sidecar['occupations'][spin, kpt]
+
+    tree = self.get_vasprun()
+    path = '/'.join(['calculation',
+                     'eigenvalues',
+                     'array',
+                     'set',
+                     "set[@comment='spin {}']".format(spin + 1),
+                     "set[@comment='kpoint {}']".format(kpt + 1)])
+    # these are all in elements like this.
+    # <r>   -3.8965    1.0000 </r>
+    return varray_to_array(tree.find(path))[:, 1]
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -114,12 +139,14 @@ def get_k_point_weights(self):
     """Return the k-point weights."""
     self.update()
 
-    with open(os.path.join(self.directory,
-                           'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
-        # each weight is in a <v>w</v> element in this varray
-        return np.array([float(x.text) for x in
-                         tree.find("kpoints/varray[@name='weights']")])
+    sidecar = self.read_sidecar()
+    if sidecar is not None:
+        return sidecar['weights']
+
+    tree = self.get_vasprun()
+    # each weight is in a <v>w</v> element in this varray
+    return np.array([float(x.text) for x in
+                     tree.find("kpoints/varray[@name='weights']")])
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -139,20 +166,44 @@ def get_number_of_spins(self):
 def get_eigenvalues(self, kpt=0, spin=1):
     """Return array of eigenvalues for kpt and spin."""
     self.update()
-    with open(os.path.join(self.directory,
-                           'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
-        path = '/'.join(['calculation',
-                         'eigenvalues',
-                         'array',
-                         'set',
-                         "set[@comment='spin {}']",
-                         "set[@comment='kpoint {}']"])
-        path = path.format(spin + 1, kpt + 1)
-        # Vasp seems to start at 1 not 0
-        fields = tree.find(path)
 
-        return np.array([float(x.text.split()[0]) for x in fields])
+    sidecar = self.read_sidecar()
+    if sidecar is not None and 'eigenvalues' in sidecar:
+        return sidecar['eigenvalues'][spin, kpt]
+
+    tree = self.get_vasprun()
+    path = '/'.join(['calculation',
+                     'eigenvalues',
+                     'array',
+                     'set',
+                     "set[@comment='spin {}']",
+                     "set[@comment='kpoint {}']"])
+    path = path.format(spin + 1, kpt + 1)
+    # Vasp seems to start at 1 not 0
+    fields = tree.find(path)
+
+    return varray_to_array(fields)[:, 0]
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_eigenvalues_and_occupations(self):
+    """Return all the eigenvalues and occupation numbers.
+
+    This reads every spin and k-point from vasprun.xml at once, which
+    is much faster than calling get_eigenvalues and
+    get_occupation_numbers for each of them.
+
+    :returns: (eigenvalues, occupations), each with the shape
+              (nspin, nkpts, nbands)
+
+    """
+    self.update()
+
+    sidecar = self.read_sidecar()
+    if sidecar is not None and 'eigenvalues' in sidecar:
+        return sidecar['eigenvalues'], sidecar['occupations']
+
+    return read_eigenvalues(self.get_vasprun())
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -160,58 +211,100 @@ def get_fermi_level(self):
     """Return the Fermi level."""
     self.update()
 
-    with open(os.path.join(self.directory,
-                           'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
-        path = '/'.join(['calculation',
-                         'dos',
-                         "i[@name='efermi']"
-                         ])
-        return float(tree.find(path).text)
+    sidecar = self.read_sidecar()
+    if sidecar is not None and 'efermi' in sidecar:
+        return float(sidecar['efermi'])
+
+    tree = self.get_vasprun()
+    path = '/'.join(['calculation',
+                     'dos',
+                     "i[@name='efermi']"
+                     ])
+    return float(tree.find(path).text)
 
 
 @monkeypatch_class(vasp.Vasp)
-def get_ados(self, atom_index, orbital, spin=1, efermi=None):
-    """Return Atom projected DOS for atom index, orbital and spin.
+def get_total_dos(self):
+    """Return the total DOS.
 
-    orbital: string ['s', 'p', 'd']
+    :returns: (energies, dos) where dos has the shape (nspin, nE). The
+              energies are not shifted by the Fermi level.
 
-    If efermi is not None, use this value as 0.0.
+    """
+    self.update()
 
-    :returns: (energies, ados)
+    sidecar = self.read_sidecar()
+    if sidecar is not None and 'dos' in sidecar:
+        return sidecar['dos_energies'], sidecar['dos']
+
+    return read_total_dos(self.get_vasprun())
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_pdos(self):
+    """Return the full projected DOS.
+
+    The array is read in one pass over vasprun.xml and kept until the
+    file changes, so selecting atoms, spins or orbitals from it is
+    just slicing.
+
+    :returns: (energies, pdos, orbitals). pdos has the shape (nions,
+              nspin, nE, norbitals) with the atoms in the same order as
+              self.atoms, and orbitals labels the last axis. LORBIT=11
+              and 12 give lm-decomposed channels, e.g. 's', 'py',
+              'pz', 'px', 'dxy', ...
+
+    The energies are not shifted by the Fermi level.
 
     """
     self.update()
 
-    with open(os.path.join(self.directory,
-                           'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
+    key = file_key(os.path.join(self.directory, 'vasprun.xml'))
+    cache = getattr(self, '_pdos_cache', None)
+    if cache is not None and cache[0] == key:
+        return cache[1]
 
-    path = "/".join(['calculation', 'dos',
-                     'partial',
-                     'array',
-                     'set',
-                     'set[@comment="ion {}"]',
-                     'set[@comment="spin {}"]',
-                     "r"])
+    sidecar = self.read_sidecar()
+    if sidecar is not None and 'pdos' in sidecar:
+        energies = sidecar['pdos_energies']
+        pdos = sidecar['pdos']
+        orbitals = [str(o) for o in sidecar['orbitals']]
+    else:
+        energies, pdos, orbitals = read_pdos(self.get_vasprun())
+    result = (energies, pdos[self.resort], orbitals)
+    self._pdos_cache = (key, result)
+    return result
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_ados(self, atom_index, orbital, spin=1, efermi=None):
+    """Return Atom projected DOS for atom index, orbital and spin.
 
-    us = [k[1] for k in
-          sorted([[j, i]
-                  for i, j in enumerate(self.resort)])]
+    orbital: string ['s', 'p', 'd']. For lm-decomposed DOS
+    (LORBIT=11/12) this is the sum over the channels of that
+    orbital. You may also use one of the channel labels from
+    get_pdos, e.g. 'px'.
 
-    path = path.format(us.index(atom_index) + 1, spin)
-    log.debug(path)
+    If efermi is not None, use this value as 0.0.
 
-    results = [[float(x) for x in el.text.split()]
-               for el in tree.findall(path)]
+    :returns: (energies, ados)
+
+    """
+    energies, pdos, orbitals = self.get_pdos()
 
     if efermi is None:
         efermi = self.get_fermi_level()
     else:
         efermi = 0.0
 
-    energy = np.array([x[0] for x in results]) - efermi
-    ados = np.array([x['spd'.index(orbital) + 1] for x in results])
+    energy = energies - efermi
+    dos = pdos[atom_index, spin - 1]
+    if orbital in orbitals:
+        ados = dos[:, orbitals.index(orbital)]
+    else:
+        columns = [i for i, label in enumerate(orbitals)
+                   if orbital_l(label) == orbital]
+        ados = dos[:, columns].sum(axis=1)
 
     return [energy, ados]
 
@@ -223,16 +316,15 @@ def get_elapsed_time(self):
     import re
     regexp = re.compile('Elapsed time \(sec\):\s*(?P<time>[0-9]*\.[0-9]*)')
 
-    if not os.path.exists(os.path.join(self.directory, 'OUTCAR')):
+    if not os.path.exists(self.outcar):
         return None
 
-    with open(os.path.join(self.directory, 'OUTCAR')) as f:
-        lines = f.readlines()
-
-    # fragile but fast.
-    m = re.search(regexp, lines[-8])
+    # The time is in the last few lines, so only the end is read.
+    matches = list(re.finditer(regexp, read_tail(self.outcar)))
+    if not matches:
+        return None
 
-    time = m.groupdict().get('time', None)
+    time = matches[-1].groupdict().get('time', None)
     if time is not None:
         return float(time)
     else:
@@ -282,17 +374,22 @@ def get_valence_electrons(self):
 def get_volumetric_data(self, filename=None, **kwargs):
     """Read filename to read the volumetric data in it.
     Supported filenames are CHG, CHGCAR, and LOCPOT.
+
+    Set VASPRC['volumetric.cache'] = True to memory-map a binary copy
+    of the data on later reads. kwargs are passed to
+    vasp.volumetric.read_volumetric, e.g. images=[-1] to read only the
+    last image, component='magnetization', or dtype=np.float32 and
+    stride=2 for a smaller, coarser grid. The x, y, z arrays have the
+    same dtype as the data.
     """
     self.update()
     if filename is None:
         filename = os.path.join(self.directory, 'CHG')
 
-    from VaspChargeDensity import VaspChargeDensity
+    from volumetric import read_volumetric
 
     atoms = self.get_atoms()
-    vd = VaspChargeDensity(filename)
-
-    data = np.array(vd.chg)
+    data = read_volumetric(filename, **kwargs)
     n0, n1, n2 = data[0].shape
 
     # This is the old code, but it doesn't seem to work anymore.
@@ -302,24 +399,26 @@ def get_volumetric_data(self, filename=None, **kwargs):
 
     # X, Y, Z = np.meshgrid(s0, s1, s2)
 
-    s0 = 1.0 / n0
-    s1 = 1.0 / n1
-    s2 = 1.0 / n2
-    X, Y, Z = np.mgrid[0.0:1.0:s0,
-                       0.0:1.0:s1,
-                       0.0:1.0:s2]
-
-    C = np.column_stack([X.ravel(),
-                         Y.ravel(),
-                         Z.ravel()])
-
-    uc = atoms.get_cell()
-    real = np.dot(C, uc)
-
-    # now convert arrays back to unitcell shape
-    x = np.reshape(real[:, 0], (n0, n1, n2))
-    y = np.reshape(real[:, 1], (n0, n1, n2))
-    z = np.reshape(real[:, 2], (n0, n1, n2))
+    # with a stride, point i is at i * stride / N, where N is the
+    # number of points in the file.
+    stride = kwargs.get('stride', 1)
+    if stride > 1:
+        from volumetric import read_header
+        with open(filename) as f:
+            N = read_header(f)[1]
+    else:
+        N = (n0, n1, n2)
+
+    # The grids are made in the dtype of the data from 1-D fractional
+    # axes, so there are no temporary float64 or index grids.
+    dt = data.dtype
+    f0, f1, f2 = [np.arange(n, dtype=dt) * dt.type(float(stride) / m)
+                  for n, m in zip((n0, n1, n2), N)]
+    uc = atoms.get_cell().astype(dt)
+
+    x, y, z = [f0[:, None, None] * uc[0, i]
+               + f1[None, :, None] * uc[1, i]
+               + f2[None, None, :] * uc[2, i] for i in range(3)]
     return (x, y, z, data)
 
 
@@ -344,11 +443,36 @@ def get_charge_density(self, spin=0, filename=None):
         filename = os.path.join(self.directory, 'CHG')
 
     if os.path.exists(filename):
-        x, y, z, data = get_volumetric_data(self, filename=filename)
-        return x, y, z, data[spin]
+        # only the image we need is read
+        x, y, z, data = get_volumetric_data(self, filename=filename,
+                                            images=[spin])
+        return x, y, z, data[0]
     else:
         return None, None, None, None
 
+
+@monkeypatch_class(vasp.Vasp)
+def _get_charge_density(self, spin=0, filename=None):
+    """Returns the charge density array, or None if there is none.
+
+    This is get_charge_density without the x, y and z arrays.
+    """
+    self.update()
+
+    if not self.parameters.get('lcharg', False):
+        warnings.warn('CHG was not written.'
+                      'Set lcharg=True to get the charge density.')
+        return None
+
+    if filename is None:
+        filename = os.path.join(self.directory, 'CHG')
+
+    if not os.path.exists(filename):
+        return None
+
+    from volumetric import read_volumetric
+    return read_volumetric(filename, images=[spin])[0]
+
 @monkeypatch_class(vasp.Vasp)
 def get_local_potential(self):
     """Returns x, y, z, and local potential arrays
@@ -364,6 +488,38 @@ def get_local_potential(self):
     return x, y, z, data[0] * atoms.get_volume()
 
 
+@monkeypatch_class(vasp.Vasp)
+def get_planar_average(self, filename=None, axis=2):
+    """Returns the planar average of the LOCPOT along axis.
+
+    The file is read a slab at a time, so the 3-D grid is never in
+    memory. Use filename for other volumetric files, e.g. CHGCAR.
+    See vasp.volumetric.planar_average.
+
+    :returns: (x, average), where x is the distance of each plane
+              along the normal of the planes.
+    """
+    self.update()
+
+    if filename is None:
+        filename = os.path.join(self.directory, 'LOCPOT')
+
+    from volumetric import planar_average
+    return planar_average(filename, axis)
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_work_function(self, axis=2):
+    """Returns the work function of a slab in eV.
+
+    This is the vacuum level, the maximum of the planar average of the
+    LOCPOT along axis, minus the Fermi level. You need lvhar=True (or
+    lvtot=True) and enough vacuum for the potential to flatten.
+    """
+    x, average = self.get_planar_average(axis=axis)
+    return average.max() - self.get_fermi_level()
+
+
 @monkeypatch_class(vasp.Vasp)
 def get_elf(self):
     """Returns x, y, z and electron localization function arrays."""
@@ -386,17 +542,10 @@ def get_electron_density_center(self, spin=0, scaled=True):
     self.update()
     atoms = self.get_atoms()
 
-    x, y, z, cd = self.get_charge_density(spin)
-    n0, n1, n2 = cd.shape
-    nelements = n0 * n1 * n2
-    voxel_volume = atoms.get_volume() / nelements
-    total_electron_charge = cd.sum() * voxel_volume
-
-    electron_density_center = np.array([(cd * x).sum(),
-                                        (cd * y).sum(),
-                                        (cd * z).sum()])
-    electron_density_center *= voxel_volume
-    electron_density_center /= total_electron_charge
+    from volumetric import grid_moments
+    cd = self._get_charge_density(spin)
+    total_electron_charge, moment = grid_moments(cd, atoms.get_cell())
+    electron_density_center = moment / total_electron_charge
 
     if scaled:
         uc = atoms.get_cell()
@@ -420,30 +569,20 @@ def get_dipole_vector(self, atoms=None):
         atoms = self.get_atoms()
 
     try:
-        x, y, z, cd = self.get_charge_density()
+        cd = self._get_charge_density()
     except (IOError, IndexError):
         # IOError: no CHG file, function called outside context manager
         # IndexError: Empty CHG file, Vasp run with lcharg=False
         return None, None, None
 
-    if None in (x, y, z, cd):
+    if cd is None:
         warnings.warn('No CHG found.')
         return None, None, None
 
-    n0, n1, n2 = cd.shape
-
-    nelements = n0 * n1 * n2
-    voxel_volume = atoms.get_volume() / nelements
-    total_electron_charge = -cd.sum() * voxel_volume
-
-    electron_density_center = np.array([(cd * x).sum(),
-                                        (cd * y).sum(),
-                                        (cd * z).sum()])
-    electron_density_center *= voxel_volume
-    electron_density_center /= total_electron_charge
-
-    electron_dipole_moment = electron_density_center * total_electron_charge
-    electron_dipole_moment *= -1.0
+    # electrons are negative
+    from volumetric import grid_moments
+    _, moment = grid_moments(cd, atoms.get_cell())
+    electron_dipole_moment = -moment
 
     # now the ion charge center
     LOP = self.get_pseudopotentials()
@@ -517,22 +656,18 @@ def get_memory(self):
     found, return None
     """
 
-    OUTCAR = os.path.join(self.directory, 'OUTCAR')
-    if os.path.exists(OUTCAR):
-        with open(OUTCAR) as f:
-            lines = f.readlines()
-    else:
+    index = self.get_outcar_index()
+    if index is None:
         return None
 
-    for line in lines:
-
-        # There are often two instances of this,
-        # but they  seem to be identical in all cases
-        if 'memory' in line:
+    # There are often two instances of this,
+    # but they  seem to be identical in all cases
+    for offset in index['memory'][:1]:
+        line = index.readline(offset)
 
-            # Return memory estimate in GB
-            required_mem = float(line.split()[-2]) / 1e6
-            return required_mem
+        # Return memory estimate in GB
+        required_mem = float(line.split()[-2]) / 1e6
+        return required_mem
 
 
 @monkeypatch_class(vasp.Vasp)
@@ -549,21 +684,15 @@ def get_orbital_occupations(self):
 
     # this finds the last entry of occupations. Sometimes, this is
     # printed multiple times in the OUTCAR.
-    with open(os.path.join(self.directory,
-                           'OUTCAR'), 'r') as f:
-        lines = f.readlines()
-        start = None
-        for i, line in enumerate(lines):
-            if line.startswith(" total charge "):
-                start = i
-
-    if not i:
+    index = self.get_outcar_index()
+    if index is None or not index['total_charge']:
         raise Exception('Occupations not found')
 
     atoms = self.get_atoms()
+    lines = index.readlines(index['total_charge'][-1], 4 + len(atoms))
     occupations = []
     for j in range(len(atoms)):
-        line = lines[start + 4 + j]
+        line = lines[4 + j]
         fields = line.split()
         s, p, d, tot = [float(x) for x in fields[1:]]
         occupations.append(np.array((s, p, d, tot)))
@@ -574,14 +703,15 @@ def get_orbital_occupations(self):
 def get_number_of_ionic_steps(self):
     """Returns number of ionic steps from the OUTCAR."""
 
-    if not os.path.exists(os.path.join(self.directory, 'OUTCAR')):
+    index = self.get_outcar_index()
+    if index is None:
         return None
 
     nsteps = None
-    for line in open(os.path.join(self.directory, 'OUTCAR')):
-        # find the last iteration number
-        if line.find('- Iteration') != -1:
-            nsteps = int(line.split('(')[0].split()[-1].strip())
+    # find the last iteration number
+    if index['iteration']:
+        line = index.readline(index['iteration'][-1])
+        nsteps = int(line.split('(')[0].split()[-1].strip())
     return nsteps
 
 
@@ -638,11 +768,10 @@ def get_program_info(self):
     if not os.path.exists(os.path.join(self.directory, 'vasprun.xml')):
         return None, None, None, None, None
 
-    with open(os.path.join(self.directory, 'vasprun.xml')) as f:
-        tree = ElementTree.parse(f)
-        program = tree.find("generator/i[@name='program']").text
-        version = tree.find("generator/i[@name='version']").text
-        subversion = tree.find("generator/i[@name='subversion']").text
-        rundate = tree.find("generator/i[@name='date']").text
-        runtime = tree.find("generator/i[@name='time']").text
-        return(program, version, subversion, rundate, runtime)
+    tree = self.get_vasprun()
+    program = tree.find("generator/i[@name='program']").text
+    version = tree.find("generator/i[@name='version']").text
+    subversion = tree.find("generator/i[@name='subversion']").text
+    rundate = tree.find("generator/i[@name='date']").text
+    runtime = tree.find("generator/i[@name='time']").text
+    return(program, version, subversion, rundate, runtime)
@@ -0,0 +1,133 @@
+"""The file that holds the DB row of a calculation.
+
+Every calculation directory has a database with one row, the atoms,
+parameters, jobid and so on, that get_db and write_db use. By default
+it is the sqlite file DB.db.
+
+sqlite locking is slow, and not always safe, on NFS and Lustre. Set
+VASPRC['db.backend'] = 'json' to keep the row in DB.json instead. It is
+an ase.db JSON file, so the row reads the same way, and it is replaced
+by writing a new file and renaming it over the old one. Readers see the
+old or the new file, and no locks are taken.
+
+Files of the other backend are still read, so directories written with
+either backend can be used.
+
+"""
+
+import os
+import tempfile
+
+from vasprc import VASPRC
+
+BACKENDS = {'sqlite': 'DB.db',
+            'json': 'DB.json'}
+
+
+def db_backend():
+    """Return the backend in VASPRC['db.backend']."""
+    backend = VASPRC.get('db.backend', 'sqlite')
+    if backend not in BACKENDS:
+        raise Exception('db.backend must be one of {}, not {}.'
+                        .format(sorted(BACKENDS), backend))
+    return backend
+
+
+def db_file(directory, write=False):
+    """Return the DB file of the calculation in directory.
+
+    This is the file of the configured backend. Unless write is True,
+    an existing file of another backend is returned when there is no
+    file of the configured one.
+
+    """
+    fname = os.path.join(directory, BACKENDS[db_backend()])
+    if write or os.path.exists(fname):
+        return fname
+    for name in BACKENDS.values():
+        if os.path.exists(os.path.join(directory, name)):
+            return os.path.join(directory, name)
+    return fname
+
+
+def get_row(db):
+    """Return row 1 of the open database db, or None."""
+    try:
+        return db.get(id=1)
+    except KeyError:
+        # an empty database
+        return None
+
+
+def write_row(fname, atoms=None, keys={}, data={}, delete=[]):
+    """Write row 1 of the database fname.
+
+    With atoms, row 1 is replaced with atoms, keys and data, and keeps
+    the unique_id, ctime and user of the old row. Without atoms, keys
+    and data are merged into the old row. The keys in delete are then
+    removed from both.
+
+    A sqlite database is changed in place in one transaction. ase.db
+    updates a row in place when it is written with the unique_id of an
+    existing row. A JSON database is written to a new, uniquely named
+    file in the same directory that is renamed over fname.
+
+    Returns False if atoms is None and there is no row to update.
+
+    """
+    from ase import Atoms
+    from ase.db import connect
+    from ase.db.row import AtomsRow
+
+    keys, data = dict(keys), dict(data)
+    exists = os.path.exists(fname)
+    with connect(fname) as db:
+        old = get_row(db) if exists else None
+        if old is None:
+            if atoms is None:
+                return False
+            row = atoms
+        elif atoms is None:
+            row = old
+            keys = dict(old.key_value_pairs.items() + keys.items())
+            data = dict(old.get('data', {}).items() + data.items())
+        else:
+            row = AtomsRow(atoms)
+            row.unique_id = old.unique_id
+            row.ctime = old.ctime
+            row.user = old.get('user')
+
+        for k in delete:
+            keys.pop(k, None)
+            data.pop(k, None)
+
+        if not isinstance(row, Atoms):
+            # ase.db writes the key_value_pairs and data of the row
+            # when the ones passed are empty, so they are cleared
+            # here, or deleting the last key would do nothing.
+            row.key_value_pairs = {}
+            row._data = {}
+
+        if fname.endswith('.json'):
+            # A unique name, so concurrent writers in one directory do
+            # not write to or remove each other's file.
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fname) or '.',
+                                       suffix='.json')
+            os.close(fd)
+            try:
+                # mkstemp makes the file private, which DB.json is not
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(tmp, 0666 & ~umask)
+                with connect(tmp, type='json') as out:
+                    out.write(row, key_value_pairs=keys, data=data)
+                os.rename(tmp, fname)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+        else:
+            db.write(row, key_value_pairs=keys, data=data)
+    return True
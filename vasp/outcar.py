@@ -0,0 +1,148 @@
+"""A byte-offset index of the sections of an OUTCAR.
+
+Many getters need one small part of the OUTCAR, and each of them used
+to read and scan the whole file. Instead, the OUTCAR is scanned once
+for all the sections we know about, and the byte offset of the first
+line of every occurrence is recorded. Getters then seek straight to the
+section they need. The index is kept on the calculator until the OUTCAR
+size or mtime changes.
+
+"""
+
+import os
+
+import vasp
+from monkeypatch import monkeypatch_class
+
+# name: a string that identifies the first line of the section. A
+# leading newline means the line must start with the rest of the
+# string.
+SECTIONS = {
+    'iteration': '- Iteration',
+    'energy': 'FREE ENERGIE OF THE ION-ELECTRON SYSTEM',
+    'forces': 'TOTAL-FORCE (eV/Angst)',
+    'stress': 'FORCE on cell =-STRESS',
+    'electrons': '\n number of electron  ',
+    'magnetization': 'magnetization (x)',
+    'total_charge': '\n total charge ',
+    'beefens': 'BEEFens',
+    'born': 'BORN EFFECTIVE CHARGES',
+    'eigenvectors': ('\n Eigenvectors and eigenvalues'
+                     ' of the dynamical matrix'),
+    'sqrt_mass': 'Eigenvectors after division by SQRT(mass)',
+    'frequency': '2PiTHz',
+    'elastic_moduli': '\n TOTAL ELASTIC MODULI (kBar)',
+    'memory': 'memory',
+    'timing': 'General timing and accounting informations',
+    'elapsed_time': 'Elapsed time (sec):',
+}
+
+
+class OutcarIndex(object):
+    """Byte offsets of the known sections in an OUTCAR.
+
+    index[name] is the sorted list of offsets of every line that
+    starts a section called name (see SECTIONS). Use `readlines` to
+    read the lines at an offset.
+
+    The file is scanned in large chunks with str.find, so building the
+    index costs about as much as reading the file once.
+
+    """
+    def __init__(self, fname, chunk_size=2 ** 24):
+        self.fname = fname
+        st = os.stat(fname)
+        self.key = (st.st_size, st.st_mtime)
+        self.offsets = dict((name, []) for name in SECTIONS)
+
+        with open(fname, 'rb') as f:
+            base, rest = 0, ''
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    self._scan(base, rest)
+                    break
+                # only scan complete lines, the rest waits for the
+                # next chunk.
+                buf = rest + data
+                end = buf.rfind('\n') + 1
+                self._scan(base, buf[:end])
+                base, rest = base + end, buf[end:]
+
+    def _scan(self, base, lines):
+        """Record the sections in lines, which start at offset base."""
+        # The newline lets patterns match at the start of the first line.
+        buf = '\n' + lines
+        for name, pattern in SECTIONS.items():
+            offsets = self.offsets[name]
+            k = buf.find(pattern)
+            while k != -1:
+                if pattern.startswith('\n'):
+                    start = k + 1
+                else:
+                    start = buf.rfind('\n', 0, k) + 1
+                offset = base + start - 1
+                if not offsets or offsets[-1] != offset:
+                    offsets.append(offset)
+                k = buf.find(pattern, k + len(pattern))
+
+    def __getitem__(self, name):
+        return self.offsets[name]
+
+    def readlines(self, offset, n=1):
+        """Return n lines of the OUTCAR starting at offset."""
+        lines = []
+        with open(self.fname) as f:
+            f.seek(offset)
+            for i in range(n):
+                lines.append(f.readline())
+        return lines
+
+    def readline(self, offset):
+        """Return the line of the OUTCAR at offset."""
+        return self.readlines(offset, 1)[0]
+
+
+def read_tail(fname, nbytes=4096):
+    """Return the last nbytes of fname.
+
+    Only the end of the file is read, which matters for large OUTCARs
+    on network file systems.
+
+    """
+    with open(fname, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - nbytes))
+        return f.read()
+
+
+def outcar_finished(fname):
+    """Return True if the OUTCAR fname is from a finished calculation.
+
+    VASP writes 'Voluntary context switches:' on the last line when it
+    is done.
+
+    """
+    if not os.path.exists(fname):
+        return False
+    lines = read_tail(fname).splitlines()
+    return len(lines) > 0 and 'Voluntary context switches:' in lines[-1]
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_outcar_index(self):
+    """Return the OutcarIndex of the OUTCAR, or None if there is none.
+
+    The index is reused until the size or mtime of the OUTCAR changes.
+
+    """
+    if not os.path.exists(self.outcar):
+        return None
+
+    st = os.stat(self.outcar)
+    index = getattr(self, '_outcar_index', None)
+    if (index is None or index.fname != self.outcar
+        or index.key != (st.st_size, st.st_mtime)):
+        index = OutcarIndex(self.outcar)
+        self._outcar_index = index
+    return index
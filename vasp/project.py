@@ -0,0 +1,350 @@
+"""An index of all the calculations in a project.
+
+Finding calculations by making a Vasp for every directory is slow,
+because each one reads its DB, checks its state and parses its
+outputs. ProjectIndex crawls a directory tree once and keeps what we
+usually search on in one sqlite file: the state, parameters,
+composition, energy, fmax and jobid of each calculation, with the size
+and mtime of the files they came from.
+
+index = ProjectIndex('project.db')
+index.update('~/projects/pt')
+for row in index.select(state=Vasp.FINISHED, elements=['Pt'], encut=500):
+    print row['directory'], row['energy']
+
+update only reads directories where one of the files changed, and
+select only queries the index, so no calculators are made.
+
+The state is found from the files, without asking the queue. A job
+that is still in the queue is NEW if it has not started, and
+NOTFINISHED if it is running.
+
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import numpy as np
+from ase.io.jsonio import encode
+
+from vasp import log
+from vasp_core import Vasp
+from metadata import BACKENDS, db_file, get_row
+from outcar import outcar_finished
+from vasprun import scan_blocks, parse_block, parse_calculation
+
+# The files that the entry of a directory depends on.
+FILES = ['INCAR', 'POSCAR', 'POTCAR', 'OUTCAR',
+         'vasprun.xml'] + sorted(BACKENDS.values())
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS calculations (
+    directory TEXT PRIMARY KEY,
+    state INTEGER,
+    parameters TEXT,
+    parameters_hash TEXT,
+    formula TEXT,
+    natoms INTEGER,
+    energy REAL,
+    fmax REAL,
+    jobid TEXT,
+    mtimes TEXT);
+CREATE TABLE IF NOT EXISTS species (
+    directory TEXT,
+    symbol TEXT,
+    count INTEGER);
+CREATE TABLE IF NOT EXISTS parameters (
+    directory TEXT,
+    key TEXT,
+    value TEXT,
+    number REAL);
+CREATE INDEX IF NOT EXISTS species_symbol ON species (symbol);
+CREATE INDEX IF NOT EXISTS parameters_key ON parameters (key, value);
+CREATE INDEX IF NOT EXISTS parameters_number ON parameters (key, number);
+'''
+
+COLUMNS = ['directory', 'state', 'parameters', 'parameters_hash',
+           'formula', 'natoms', 'energy', 'fmax', 'jobid', 'mtimes']
+
+
+def file_mtimes(directory):
+    """Return {name: [size, mtime]} of FILES in directory.
+
+    Missing files are left out.
+
+    """
+    mtimes = {}
+    for name in FILES:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        mtimes[name] = [st.st_size, st.st_mtime]
+    return mtimes
+
+
+def is_calculation(directory, files):
+    """Return True if files in directory make it a calculation."""
+    return 'INCAR' in files or any(name in files
+                                   for name in BACKENDS.values())
+
+
+def file_state(directory, jobid=None):
+    """Return the state of the calculation in directory from its files.
+
+    This follows Vasp.get_state, except that the queue is not queried.
+
+    """
+    def exists(name):
+        return os.path.exists(os.path.join(directory, name))
+
+    if (exists('INCAR') and exists('POTCAR') and not exists('POSCAR')
+        and os.path.isdir(os.path.join(directory, '00'))):
+        return Vasp.NEB
+    if not all(exists(f) for f in ['INCAR', 'POSCAR', 'POTCAR']):
+        return Vasp.EMPTY
+    if jobid is not None and not exists('OUTCAR'):
+        return Vasp.NEW
+    if outcar_finished(os.path.join(directory, 'OUTCAR')):
+        return Vasp.FINISHED
+    return Vasp.NOTFINISHED
+
+
+def last_step(fname):
+    """Return the last complete ionic step in the vasprun.xml fname.
+
+    Only the last <calculation> block is parsed. Returns None if there
+    is none.
+
+    """
+    if not os.path.exists(fname):
+        return None
+    with open(fname, 'rb') as f:
+        blocks = scan_blocks(f, 'calculation')
+        if not blocks:
+            return None
+        return parse_calculation(parse_block(f, blocks[-1]))
+
+
+def parameters_hash(parameters):
+    """Return a sha1 hash of the parameters, independent of key order."""
+    text = json.dumps(json.loads(encode(parameters)), sort_keys=True)
+    return hashlib.sha1(text).hexdigest()
+
+
+def read_entry(directory):
+    """Return the index entry of the calculation in directory.
+
+    The entry is a dictionary with the COLUMNS, and the species as
+    {symbol: count}. The parameters, atoms and jobid come from the DB
+    row, and the energy and fmax from the last step in vasprun.xml.
+
+    """
+    import ase.io
+    entry = dict((column, None) for column in COLUMNS)
+    entry['directory'] = directory
+    entry['mtimes'] = file_mtimes(directory)
+
+    atoms, parameters, resort = None, {}, None
+    dbfile = db_file(directory)
+    if os.path.exists(dbfile):
+        from ase.db import connect
+        with connect(dbfile) as con:
+            row = get_row(con)
+        if row is not None:
+            atoms = row.toatoms()
+            data = row.get('data', {})
+            parameters = data.get('parameters', {}) or {}
+            resort = data.get('resort', None)
+            entry['jobid'] = (row.key_value_pairs.get('jobid', None)
+                              or data.get('jobid', None))
+    if atoms is None and os.path.exists(os.path.join(directory, 'POSCAR')):
+        atoms = ase.io.read(os.path.join(directory, 'POSCAR'))
+
+    entry['state'] = file_state(directory, entry['jobid'])
+    entry['parameters'] = parameters
+    entry['parameters_hash'] = parameters_hash(parameters)
+
+    entry['species'] = {}
+    if atoms is not None:
+        symbols = atoms.get_chemical_symbols()
+        entry['species'] = dict((s, symbols.count(s)) for s in set(symbols))
+        entry['formula'] = atoms.get_chemical_formula()
+        entry['natoms'] = len(atoms)
+
+    step = last_step(os.path.join(directory, 'vasprun.xml'))
+    if step is not None:
+        entry['energy'] = step['energy']
+        forces = step['forces']
+        if forces is not None:
+            # the constraints of the atoms are in the user order
+            if resort is not None and atoms is not None:
+                forces = forces[list(resort)]
+                for constraint in atoms.constraints:
+                    constraint.adjust_forces(atoms, forces)
+            entry['fmax'] = float(np.sqrt((forces ** 2).sum(axis=1)).max())
+    return entry
+
+
+class ProjectIndex(object):
+    """A sqlite index of the calculations in directory trees.
+
+    fname is the sqlite file, which is created if needed. The
+    directories in the index are absolute paths.
+
+    """
+    def __init__(self, fname='project.db'):
+        self.fname = fname
+        con = self._connect()
+        try:
+            con.executescript(SCHEMA)
+        finally:
+            con.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.fname, timeout=600)
+
+    def update(self, root='.'):
+        """Index the calculations in the tree at root.
+
+        Directories whose files have not changed since the last update
+        are skipped. Entries for directories under root that are no
+        longer calculations are removed. So are the entries of
+        directories that cannot be read, e.g. because of a corrupt
+        DB.db, so the index never has out of date values. They are
+        tried again on the next update.
+
+        Returns (updated, removed, failed), the lists of directories
+        that were indexed again, removed, and could not be read.
+
+        """
+        root = os.path.abspath(os.path.expanduser(root))
+        con = self._connect()
+        try:
+            known = dict((directory, mtimes) for directory, mtimes in
+                         con.execute('SELECT directory, mtimes '
+                                     'FROM calculations')
+                         if directory == root
+                         or directory.startswith(os.path.join(root, '')))
+
+            updated, failed, found = [], [], set()
+            for directory, dirs, files in os.walk(root):
+                dirs.sort()
+                if not is_calculation(directory, files):
+                    continue
+                found.add(directory)
+                mtimes = file_mtimes(directory)
+                if (directory in known
+                    and json.loads(known[directory]) == mtimes):
+                    continue
+                try:
+                    entry = read_entry(directory)
+                except Exception, e:
+                    log.warning('Could not index {}: {}'.format(directory, e))
+                    with con:
+                        self._delete(con, directory)
+                    failed.append(directory)
+                    continue
+                with con:
+                    self._write(con, entry)
+                updated.append(directory)
+
+            removed = sorted(set(known) - found)
+            with con:
+                for directory in removed:
+                    self._delete(con, directory)
+        finally:
+            con.close()
+        return updated, removed, failed
+
+    def _delete(self, con, directory):
+        for table in ['calculations', 'species', 'parameters']:
+            con.execute('DELETE FROM {} WHERE directory = ?'.format(table),
+                        (directory,))
+
+    def _write(self, con, entry):
+        directory = entry['directory']
+        self._delete(con, directory)
+        values = dict(entry)
+        values['parameters'] = encode(entry['parameters'])
+        values['mtimes'] = json.dumps(entry['mtimes'])
+        con.execute('INSERT INTO calculations VALUES ({})'
+                    .format(', '.join('?' * len(COLUMNS))),
+                    [values[column] for column in COLUMNS])
+        con.executemany('INSERT INTO species VALUES (?, ?, ?)',
+                        [(directory, symbol, count)
+                         for symbol, count in entry['species'].items()])
+
+        parameters = json.loads(values['parameters'])
+        rows = []
+        for key, value in parameters.items():
+            number = None
+            if (isinstance(value, (int, float))
+                and not isinstance(value, bool)):
+                number = value
+            rows.append((directory, key, json.dumps(value, sort_keys=True),
+                         number))
+        con.executemany('INSERT INTO parameters VALUES (?, ?, ?, ?)', rows)
+
+    def select(self, state=None, elements=None, formula=None, **parameters):
+        """Return the entries that match all the arguments.
+
+        state is one of the Vasp states, elements a list of chemical
+        symbols that must all be in the atoms, and formula the
+        chemical formula. Other keyword arguments are parameters, e.g.
+        encut=500 or xc='PBE'. Numbers match numerically, so 500 and
+        500.0 are the same.
+
+        Each entry is a dictionary of the indexed values, with the
+        parameters decoded.
+
+        """
+        where, args = [], []
+        if state is not None:
+            where.append('state = ?')
+            args.append(state)
+        if formula is not None:
+            where.append('formula = ?')
+            args.append(formula)
+        for symbol in elements or []:
+            where.append('directory IN (SELECT directory FROM species '
+                         'WHERE symbol = ?)')
+            args.append(symbol)
+        for key, value in sorted(parameters.items()):
+            if (isinstance(value, (int, float))
+                and not isinstance(value, bool)):
+                where.append('directory IN (SELECT directory FROM parameters'
+                             ' WHERE key = ? AND number = ?)')
+            else:
+                value = json.dumps(json.loads(encode(value)), sort_keys=True)
+                where.append('directory IN (SELECT directory FROM parameters'
+                             ' WHERE key = ? AND value = ?)')
+            args += [key, value]
+
+        sql = 'SELECT {} FROM calculations'.format(', '.join(COLUMNS))
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY directory'
+
+        con = self._connect()
+        try:
+            rows = con.execute(sql, args).fetchall()
+        finally:
+            con.close()
+
+        entries = []
+        for row in rows:
+            entry = dict(zip(COLUMNS, row))
+            entry['parameters'] = json.loads(entry['parameters'])
+            entry['mtimes'] = json.loads(entry['mtimes'])
+            entries.append(entry)
+        return entries
+
+    def __len__(self):
+        con = self._connect()
+        try:
+            return con.execute('SELECT COUNT(*) FROM calculations')\
+                      .fetchone()[0]
+        finally:
+            con.close()
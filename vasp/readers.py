@@ -6,8 +6,10 @@ import numpy as np
 import vasp
 from vasp import log
 from ase.calculators.calculator import Parameters
+from ase.calculators.calculator import PropertyNotImplementedError
 import exceptions
 from monkeypatch import monkeypatch_class
+from sidecar import sidecar_enabled, sidecar_atoms
 import ase
 
 
@@ -230,10 +232,7 @@ def read_atoms(self):
     # for a new or pre-vasp calculation resort will be None
     if resort is not None:
         resort = list(resort)
-        from ase.db import connect
-        with connect(os.path.join(self.directory, 'DB.db')) as con:
-            temp_atoms = con.get_atoms(id=1)
-            tags = temp_atoms.get_tags()
+        tags = self.get_db_row().toatoms().get_tags()
     else:
         tags = None
 
@@ -241,7 +240,13 @@ def read_atoms(self):
 
     vasprun_xml = os.path.join(self.directory,
                                'vasprun.xml')
-    if os.path.exists(vasprun_xml):
+    sidecar = self.read_sidecar()
+    if sidecar is not None:
+        atoms = sidecar_atoms(sidecar)
+        if resort is not None:
+            atoms = atoms[resort]
+        atoms.set_tags(tags)
+    elif os.path.exists(vasprun_xml):
         atoms = ase.io.read(vasprun_xml)
         if resort is not None:
             atoms = atoms[resort]
@@ -374,9 +379,14 @@ def read_results(self):
             exc = 'No vasprun.xml in {}'.format(self.directory)
             raise exceptions.VaspNotFinished(exc)
 
-        # this has a single-point calculator on it. but no tags.
-        atoms = ase.io.read(os.path.join(self.directory,
-                                         'vasprun.xml'))
+        sidecar = self.read_sidecar()
+        if sidecar is not None:
+            # an earlier read saved everything we need.
+            atoms = sidecar_atoms(sidecar)
+        else:
+            # this has a single-point calculator on it. but no tags.
+            atoms = ase.io.read(os.path.join(self.directory,
+                                             'vasprun.xml'))
 
         energy = atoms.get_potential_energy()
         free_energy = atoms.get_potential_energy(force_consistent=True)
@@ -403,26 +413,34 @@ def read_results(self):
 
         magnetic_moment = 0
         magnetic_moments = np.zeros(len(atoms))
-        if self.parameters.get('ispin', 0) == 2:
-            lines = open(os.path.join(self.directory, 'OUTCAR'),
-                         'r').readlines()
-            for n, line in enumerate(lines):
-                if line.startswith(' number of electron  '):
-                    try:
-                        magnetic_moment = float(line.split()[-1])
-                    except:
-                        print 'magmom read error'
-                        print self.directory, line
-
-                if line.rfind('magnetization (x)') > -1:
-                    for m in range(len(atoms)):
-                        val = float(lines[n + m + 4].split()[4])
-                        magnetic_moments[m] = val
+        if sidecar is not None:
+            magnetic_moment = float(sidecar['magmom'])
+            magnetic_moments = sidecar['magmoms']
+        elif self.parameters.get('ispin', 0) == 2:
+            # the last entries are the final ones.
+            index = self.get_outcar_index()
+            if index['electrons']:
+                line = index.readline(index['electrons'][-1])
+                try:
+                    magnetic_moment = float(line.split()[-1])
+                except:
+                    print 'magmom read error'
+                    print self.directory, line
+
+            if index['magnetization']:
+                lines = index.readlines(index['magnetization'][-1],
+                                        4 + len(atoms))
+                for m in range(len(atoms)):
+                    val = float(lines[m + 4].split()[4])
+                    magnetic_moments[m] = val
 
         self.results['magmom'] = magnetic_moment
         self.results['magmoms'] = np.array(magnetic_moments)[self.resort]
         log.debug('Results at end: {}'.format(self.results))
 
+        if sidecar is None and sidecar_enabled():
+            self.write_sidecar(magnetic_moment, magnetic_moments)
+
 
 @monkeypatch_class(vasp.Vasp)
 def read_neb(self):
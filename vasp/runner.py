@@ -200,7 +200,7 @@ runvasp.py     # this is the vasp command
     if out == '' or err != '':
         raise Exception('something went wrong in qsub:\n\n{0}'.format(err))
 
-    self.write_db(data={'jobid': out.strip()})
+    self.update_db(data={'jobid': out.strip()})
 
     raise VaspSubmitted('{} submitted: {}'.format(self.directory,
                                                   out.strip()))
@@ -242,7 +242,7 @@ def set_memory(self,
             memory = self.get_memory()
 
             # Write the recommended memory to the DB file
-            self.write_db(data={'memory': memory})
+            self.update_db(data={'memory': memory})
 
         # If no OUTCAR exists, we run a 'dummy' calculation
         else:
@@ -298,7 +298,7 @@ def set_memory(self,
             self.write_incar()
 
             # Write the recommended memory to the DB file
-            self.write_db(data={'memory': memory})
+            self.update_db(data={'memory': memory})
 
             # Remove all non-initialization files
             files = ['CHG', 'CHGCAR', 'CONTCAR', 'DOSCAR',
@@ -1,5 +1,6 @@
 """Properties for serializing vasp calculations."""
-import os
+import shutil
+import tempfile
 from os.path import join
 import vasp as VASP
 
@@ -34,12 +35,16 @@ setattr(VASP.Vasp, 'vasp', property(vasp))
 
 def vasp_json(self):
     """Return a json representation."""
-    json = join(self.directory, 'DB.json')
-    self.write_db(fname=json)
-    with open(json) as f:
-        s = f.read()
-
-    os.unlink(json)
+    # Not in the calculation directory, where DB.json may be the
+    # database of the json backend.
+    tmpdir = tempfile.mkdtemp()
+    json = join(tmpdir, 'DB.json')
+    try:
+        self.write_db(fname=json)
+        with open(json) as f:
+            s = f.read()
+    finally:
+        shutil.rmtree(tmpdir)
     return s
 
 setattr(VASP.Vasp, 'json', property(vasp_json))
@@ -49,11 +54,7 @@ def vasp_jsonpp(self):
     """Return a pretty-printed json representation."""
     import json
 
-    jsonf = join(self.directory, 'DB.json')
-    self.write_db(fname=jsonf)
-    with open(jsonf) as f:
-        d = json.loads(f.read())
-    os.unlink(jsonf)
+    d = json.loads(self.json)
     return json.dumps(d, sort_keys=True, indent=4)
 
 setattr(VASP.Vasp, 'jsonpp', property(vasp_jsonpp))
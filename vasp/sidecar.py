@@ -0,0 +1,218 @@
+"""Binary sidecar for the parsed outputs of finished calculations.
+
+Set VASPRC['vasprun.sidecar'] = True and the first time the results of
+a FINISHED calculation are read, the arrays parsed from vasprun.xml and
+OUTCAR are saved in a compressed vasprun.npz next to them. Later reads,
+including in new Python sessions, load arrays from the sidecar instead
+of parsing XML, as long as vasprun.xml and OUTCAR have not changed.
+
+Everything in the sidecar is in VASP order, like the files it comes
+from. Arrays are decompressed one at a time when they are used. Only
+what is in vasprun.xml is saved, e.g. there is no projected DOS without
+LORBIT, and the getters read vasprun.xml for what is missing.
+
+"""
+
+import os
+import numpy as np
+import ase
+
+import vasp
+from vasp import log
+from vasprc import VASPRC
+from monkeypatch import monkeypatch_class
+from vasprun import (iter_ionic_steps, read_eigenvalues, read_total_dos,
+                     read_pdos, varray_to_array)
+
+SIDECAR = 'vasprun.npz'
+
+
+class Sidecar(object):
+    """Lazy view of a vasprun.npz file.
+
+    Arrays are read the first time they are used and then kept. The
+    file is not held open between reads, so many of these can exist
+    at once without running out of file handles.
+
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        self.arrays = {}
+        with np.load(fname) as npz:
+            self.files = npz.files
+
+    def __contains__(self, key):
+        return key in self.files
+
+    def __getitem__(self, key):
+        if key not in self.arrays:
+            with np.load(self.fname) as npz:
+                self.arrays[key] = npz[key]
+        return self.arrays[key]
+
+
+def sidecar_enabled():
+    """Return True if VASPRC['vasprun.sidecar'] is set."""
+    return VASPRC.get('vasprun.sidecar', False) in [True, 'True', 'true',
+                                                    '1']
+
+
+def source_keys(directory):
+    """Return the [size, mtime] of vasprun.xml and OUTCAR in directory.
+
+    Missing files get [-1, -1].
+
+    """
+    keys = []
+    for f in ['vasprun.xml', 'OUTCAR']:
+        try:
+            st = os.stat(os.path.join(directory, f))
+            keys += [[st.st_size, st.st_mtime]]
+        except OSError:
+            keys += [[-1, -1]]
+    return np.array(keys, dtype=float)
+
+
+@monkeypatch_class(vasp.Vasp)
+def read_sidecar(self):
+    """Return the sidecar for this calculation, or None.
+
+    None is returned when sidecars are not enabled, when there is no
+    sidecar, or when vasprun.xml or OUTCAR changed after it was
+    written. The sidecar is a lazy, dictionary-like `Sidecar`.
+
+    """
+    if not sidecar_enabled():
+        return None
+
+    fname = os.path.join(self.directory, SIDECAR)
+    if not os.path.exists(fname):
+        return None
+
+    sources = source_keys(self.directory)
+    cache = getattr(self, '_sidecar_cache', None)
+    if cache is not None and np.array_equal(cache[0], sources):
+        return cache[1]
+
+    sidecar = Sidecar(fname)
+    if not np.array_equal(sidecar['sources'], sources):
+        log.debug('{} is out of date.'.format(fname))
+        self._sidecar_cache = None
+        return None
+
+    self._sidecar_cache = (sources, sidecar)
+    return sidecar
+
+
+@monkeypatch_class(vasp.Vasp)
+def write_sidecar(self, magmom=0.0, magmoms=None):
+    """Write the parsed outputs of a finished calculation to vasprun.npz.
+
+    magmom and magmoms are read from the OUTCAR by read_results, which
+    passes them here. magmoms must be in VASP order.
+
+    The file is written to a temporary name and renamed, so readers
+    never see a partial sidecar. If the directory cannot be written,
+    e.g. it is read-only, no sidecar is written.
+
+    """
+    tree = self.get_vasprun()
+    arrays = {'sources': source_keys(self.directory)}
+
+    arrays['kpoints'] = varray_to_array(
+        tree.find("kpoints/varray[@name='kpointlist']"))
+    arrays['weights'] = varray_to_array(
+        tree.find("kpoints/varray[@name='weights']"))[:, 0]
+
+    selective = tree.find("structure[@name='initialpos']"
+                          "/varray[@name='selective']")
+    if selective is not None:
+        arrays['selective'] = np.array([v.text.split() for v in selective])
+
+    if tree.find('calculation/eigenvalues') is not None:
+        arrays['eigenvalues'], arrays['occupations'] = read_eigenvalues(tree)
+
+    efermi = tree.find("calculation/dos/i[@name='efermi']")
+    if efermi is not None:
+        arrays['efermi'] = float(efermi.text)
+
+    if tree.find('calculation/dos/total') is not None:
+        arrays['dos_energies'], arrays['dos'] = read_total_dos(tree)
+
+    if tree.find('calculation/dos/partial') is not None:
+        (arrays['pdos_energies'],
+         arrays['pdos'],
+         orbitals) = read_pdos(tree)
+        arrays['orbitals'] = np.array(orbitals)
+
+    steps = list(iter_ionic_steps(os.path.join(self.directory,
+                                               'vasprun.xml')))
+    natoms = len(steps[0]['symbols'])
+    arrays['symbols'] = np.array(steps[0]['symbols'])
+    for key in ['cell', 'scaled_positions', 'energy', 'free_energy']:
+        arrays[key] = np.array([step[key] for step in steps])
+    arrays['forces'] = np.array([step['forces']
+                                 if step['forces'] is not None
+                                 else np.nan * np.ones((natoms, 3))
+                                 for step in steps])
+    arrays['stress'] = np.array([step['stress']
+                                 if step['stress'] is not None
+                                 else np.nan * np.ones(6)
+                                 for step in steps])
+
+    arrays['magmom'] = magmom
+    if magmoms is None:
+        magmoms = np.zeros(natoms)
+    arrays['magmoms'] = np.array(magmoms)
+
+    fname = os.path.join(self.directory, SIDECAR)
+    tmp = fname + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.rename(tmp, fname)
+    except (IOError, OSError), e:
+        log.debug('Could not write {}: {}'.format(fname, e))
+        return
+    self._sidecar_cache = None
+    log.debug('Wrote {}'.format(fname))
+
+
+def sidecar_atoms(sidecar, index=-1):
+    """Return the Atoms of ionic step index in a sidecar.
+
+    The atoms are in VASP order and have a SinglePointCalculator with
+    the energy, free energy, forces and stress of that step, like the
+    atoms ase.io.read returns for vasprun.xml.
+
+    """
+    from ase.calculators.singlepoint import SinglePointCalculator as SPC
+    from ase.constraints import FixAtoms, FixScaled
+
+    cell = sidecar['cell']
+    atoms = ase.Atoms([str(s) for s in sidecar['symbols']],
+                      cell=cell[index],
+                      scaled_positions=sidecar['scaled_positions'][index],
+                      pbc=True)
+
+    if 'selective' in sidecar:
+        constraints, fixed = [], []
+        for i, flags in enumerate(sidecar['selective'] == 'F'):
+            if flags.all():
+                fixed.append(i)
+            elif flags.any():
+                constraints.append(FixScaled(cell[0], i, flags))
+        if fixed:
+            constraints.append(FixAtoms(fixed))
+        atoms.set_constraint(constraints)
+
+    forces = sidecar['forces'][index]
+    stress = sidecar['stress'][index]
+    atoms.set_calculator(SPC(atoms,
+                             energy=sidecar['energy'][index],
+                             free_energy=sidecar['free_energy'][index],
+                             forces=(None if np.isnan(forces).any()
+                                     else forces),
+                             stress=(None if np.isnan(stress).any()
+                                     else stress)))
+    return atoms
@@ -0,0 +1,177 @@
+"""Summarize many calculations in parallel, for bin/vaspsum.
+
+Making a Vasp for a directory reads its files, so summarizing a large
+project one directory at a time is slow. `summarize_all` does it in a
+pool of processes and yields one record per directory as soon as it is
+ready. Each directory has its own timeout, and an error in one
+directory is reported in its record without stopping the others.
+
+A record is a dictionary with the directory, the status ('ok',
+'error' or 'timeout'), the state, formula and energy of the
+calculation, the text output, the error message and the time it took.
+
+"""
+
+import sys
+import time
+import json
+import signal
+import multiprocessing
+from StringIO import StringIO
+
+from vasp import log
+
+FIELDS = ['directory', 'status', 'state', 'formula', 'energy', 'elapsed',
+          'error']
+
+
+class Timeout(BaseException):
+    # Not an Exception, so the exception handlers of Vasp do not catch it.
+    pass
+
+
+def _alarm(signum, frame):
+    raise Timeout()
+
+
+def _disarm(handler):
+    """Stop the timer, and restore the SIGALRM handler if there is one."""
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    if handler is not None:
+        signal.signal(signal.SIGALRM, handler)
+
+
+def new_record(directory):
+    """Return an empty record for directory."""
+    record = dict((field, None) for field in FIELDS)
+    record.update(directory=directory, output=None)
+    return record
+
+
+def timeout_record(directory, timeout, elapsed):
+    """Return the record of a directory that timed out."""
+    record = new_record(directory)
+    record.update(status='timeout', elapsed=elapsed,
+                  error='timed out after {} s'.format(timeout))
+    return record
+
+
+def summarize(directory, output='summary', timeout=None, debug=None):
+    """Return the record of the calculation in directory.
+
+    output is the text to include: 'summary' for str(calc), 'vasp',
+    'json' or 'jsonpp' for those properties, 'describe' or 'long' for
+    calc.describe, and None for none.
+
+    timeout is in seconds. It uses SIGALRM, so this must run in the
+    main thread of a process. debug is passed to Vasp.
+
+    Set VASPRC['mode'] = None first, so no calculations are started.
+
+    """
+    from vasp import Vasp
+
+    record = new_record(directory)
+    t0 = time.time()
+    handler = None
+    try:
+        if timeout:
+            handler = signal.signal(signal.SIGALRM, _alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        calc = Vasp(directory, debug=debug)
+        record['state'] = calc.get_state()
+        atoms = calc.get_atoms()
+        if atoms is not None:
+            record['formula'] = atoms.get_chemical_formula()
+        if record['state'] == Vasp.FINISHED:
+            energy = calc.potential_energy
+            if energy is not None:
+                record['energy'] = float(energy)
+
+        if output == 'summary':
+            record['output'] = str(calc)
+        elif output in ['vasp', 'json', 'jsonpp']:
+            record['output'] = getattr(calc, output)
+        elif output in ['describe', 'long']:
+            stdout, sys.stdout = sys.stdout, StringIO()
+            try:
+                calc.describe(long=output == 'long')
+                record['output'] = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+        _disarm(handler)
+        record['status'] = 'ok'
+    except Timeout:
+        _disarm(handler)
+        return timeout_record(directory, timeout, time.time() - t0)
+    except Exception, e:
+        _disarm(handler)
+        log.debug('{}: {}'.format(directory, e))
+        record['status'] = 'error'
+        record['error'] = '{}: {}'.format(e.__class__.__name__, e)
+    finally:
+        _disarm(handler)
+    record['elapsed'] = time.time() - t0
+    return record
+
+
+def _summarize(args):
+    """Unpack the arguments of summarize, for Pool.imap.
+
+    The timer can still go off between the last statement of summarize
+    and the handler that stops it. That Timeout is turned into a record
+    here, because a pool worker dies on exceptions that are not an
+    Exception.
+
+    """
+    t0 = time.time()
+    try:
+        return summarize(*args)
+    except Timeout:
+        _disarm(None)
+        return timeout_record(args[0], args[2], time.time() - t0)
+
+
+def summarize_all(directories, output='summary', timeout=None, jobs=1,
+                  ordered=True, debug=None):
+    """Yield the records of directories.
+
+    With jobs > 1 the directories are summarized in a pool of jobs
+    processes. If ordered is True the records are in the order of
+    directories, otherwise in the order they are done.
+
+    """
+    tasks = [(d, output, timeout, debug) for d in directories]
+    if jobs <= 1:
+        for task in tasks:
+            yield _summarize(task)
+        return
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        imap = pool.imap if ordered else pool.imap_unordered
+        for record in imap(_summarize, tasks):
+            yield record
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def format_jsonl(record):
+    """Return record as one line of JSON."""
+    return json.dumps(record, sort_keys=True)
+
+
+def format_tsv(record, fields=FIELDS):
+    """Return the fields of record as a tab separated line.
+
+    Tabs and newlines in values are replaced by spaces.
+
+    """
+    values = []
+    for field in fields:
+        value = record.get(field)
+        value = '' if value is None else str(value)
+        values.append(value.replace('\t', ' ').replace('\n', ' '))
+    return '\t'.join(values)
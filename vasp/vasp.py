@@ -23,6 +23,10 @@ from vasp_core import Vasp
 # These modules monkeypatch the Vasp class
 import writers
 import readers
+import vasprun
+import sidecar
+import outcar
+import follow
 import getters
 import setters
 import vib
@@ -13,7 +13,6 @@ import numpy as np
 import ase
 from ase.calculators.calculator import Calculator
 from ase.calculators.calculator import FileIOCalculator
-from ase.io import read
 from ase.io.jsonio import encode
 import json
 
@@ -21,6 +20,7 @@ import json
 import exceptions
 import validate
 from vasprc import VASPRC
+from metadata import db_file
 from vasp import log
 
 
@@ -66,6 +66,9 @@ class Vasp(FileIOCalculator, object):
     # List of calculators created
     calculators = []
 
+    # Memoized states, {directory: (key, state)}. See get_state.
+    _state_cache = {}
+
     implemented_properties = ['energy', 'free_energy', 'forces', 'stress',
                               'charges', 'dipole',
                               'magmom',  # the overall magnetic moment
@@ -400,9 +403,7 @@ class Vasp(FileIOCalculator, object):
             ns =  [k[1] for k in
                    sorted([[j, i]
                            for i, j in enumerate(self.get_db('resort'))])]
-            from ase.db import connect
-            with connect(os.path.join(self.directory, 'DB.db')) as con:
-                tatoms = con.get_atoms(id=1)
+            tatoms = self.get_db_row().toatoms()
             self.write_db(atoms=tatoms, data={'resort': ns})
             print('Fixed resort issue in {}. '
                   'You should not see this message'
@@ -691,11 +692,9 @@ class Vasp(FileIOCalculator, object):
                 return True
 
         # if the calculation is finished we do not need to run.
-        if os.path.exists(self.outcar):
-            with open(self.outcar) as f:
-                lines = f.readlines()
-                if 'Voluntary context switches:' in lines[-1]:
-                    return False
+        from outcar import outcar_finished
+        if outcar_finished(self.outcar):
+            return False
 
     def clone(self, newdir, set_label=True):
         """Copy the calculation directory to newdir and set label to
@@ -721,18 +720,41 @@ class Vasp(FileIOCalculator, object):
                 os.unlink(os.path.join(newdir, 'CONTCAR'))
 
             # eliminate jobid on copying.
-            newdb = os.path.join(newdir, 'DB.db')
+            newdb = db_file(newdir, write=True)
             self.write_db(fname=newdb,
                           data={'path': os.path.abspath(newdir),
                                 'jobid': None})
         if set_label:
             self.__init__(newdir)
 
+    def _state_key(self):
+        """Return the (OUTCAR size, OUTCAR mtime, DB size, DB mtime) key.
+
+        get_state is memoized on this key. The writers of the DB also
+        drop the memo, because a DB.db updated in place within the
+        mtime resolution of the filesystem can keep its size and mtime.
+
+        """
+        key = (None, None, None, None)
+        if os.path.exists(self.outcar):
+            st = os.stat(self.outcar)
+            key = (st.st_size, st.st_mtime, None, None)
+
+        dbfile = db_file(self.directory)
+        if os.path.exists(dbfile):
+            st = os.stat(dbfile)
+            key = key[:2] + (st.st_size, st.st_mtime)
+        return key
+
     def get_state(self):
         """Determine calculation state based on directory contents.
 
         Returns an integer for the state.
 
+        FINISHED and NOTFINISHED are memoized per directory until the
+        OUTCAR or DB.db change, so polling many calculations does not
+        query the queue or read OUTCARs that have not changed.
+
         """
         # We do not check for KPOINTS here. That file may not exist if
         # the kspacing incar parameter is used.
@@ -751,36 +773,56 @@ class Vasp(FileIOCalculator, object):
             # some input file is missing
             return Vasp.EMPTY
 
+        directory = os.path.abspath(self.directory)
+        key = self._state_key()
+        cached = Vasp._state_cache.get(directory)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        state = self._get_state()
+        # A queued job can leave the queue without touching any files,
+        # so only these are safe to keep.
+        if state in [Vasp.FINISHED, Vasp.NOTFINISHED]:
+            Vasp._state_cache[directory] = (key, state)
+        else:
+            Vasp._state_cache.pop(directory, None)
+        return state
+
+    def _get_state(self):
+        """Determine the state after the input files are checked.
+
+        This is the part of get_state that needs the DB, the queue or
+        the OUTCAR.
+
+        """
+        from outcar import outcar_finished
+
         # Input files exist, but no jobid, and no output
-        if (np.array(base_input).all()
-            and self.get_db('jobid') is not None
+        if (self.get_db('jobid') is not None
             and not os.path.exists(os.path.join(self.directory, 'OUTCAR'))):
             return Vasp.NEW
 
         # INPUT files exist, a jobid in the queue
-        if self.in_queue():
+        queued = self.in_queue()
+        if queued:
             return Vasp.QUEUED
 
         # Not in queue, and finished
-        if not self.in_queue():
-            if os.path.exists(self.outcar):
-                with open(self.outcar) as f:
-                    lines = f.readlines()
-                    if 'Voluntary context switches:' in lines[-1]:
-                        return Vasp.FINISHED
+        finished = outcar_finished(self.outcar)
+        if not queued:
+            if finished:
+                return Vasp.FINISHED
 
         # Not in queue, and not finished
-        if not self.in_queue():
+        if not queued:
             if os.path.exists(self.outcar):
-                with open(self.outcar) as f:
-                    lines = f.readlines()
-                    if 'Voluntary context switches:' not in lines[-1]:
-                        return Vasp.NOTFINISHED
+                if not finished:
+                    return Vasp.NOTFINISHED
             else:
                 return Vasp.NOTFINISHED
 
         # Not in queue, and not finished, with empty contcar
-        if not self.in_queue():
+        if not queued:
             if os.path.exists(self.contcar):
                 with open(self.contcar) as f:
                     if f.read() == '':
@@ -854,8 +896,14 @@ class Vasp(FileIOCalculator, object):
     def traj(self):
         """Get a trajectory.
 
-        This reads Atoms objects from vasprun.xml. By default returns
-        all images.  If index is an integer, return that image.
+        This streams the ionic steps from vasprun.xml one at a time,
+        so only the resulting Atoms objects are kept in memory. By
+        default returns all images.  If index is an integer, return
+        that image.
+
+        If VASPRC['vasprun.lazy_traj'] is True, a VasprunTrajectory is
+        returned instead. It can be indexed and sliced like a list, but
+        only decodes the images you ask for.
 
         Technically, this is just a list of atoms with a
         SinglePointCalculator attached to them.
@@ -866,6 +914,7 @@ class Vasp(FileIOCalculator, object):
 
         """
         from ase.calculators.singlepoint import SinglePointCalculator as SPC
+        from vasprun import iter_ionic_steps, step_to_atoms
         self.update()
 
         if self.neb:
@@ -875,25 +924,28 @@ class Vasp(FileIOCalculator, object):
                 x.set_calculator(SPC(x, energy=energies[i]))
             return tatoms
 
-        LOA = []
-        for atoms in read(os.path.join(self.directory, 'vasprun.xml'), ':'):
-            catoms = atoms.copy()
-            catoms = catoms[self.resort]
-            catoms.set_calculator(SPC(catoms,
-                                      energy=atoms.get_potential_energy(),
-                                      forces=atoms.get_forces()[self.resort]))
-            LOA += [catoms]
-        return LOA
+        if VASPRC['vasprun.lazy_traj'] in [True, 'True', 'true', '1']:
+            return self.get_lazy_trajectory()
+
+        constraints = self.get_atoms().constraints
+        return [step_to_atoms(step, self.resort, constraints)
+                for step in iter_ionic_steps(os.path.join(self.directory,
+                                                          'vasprun.xml'))]
 
     def view(self, index=None):
         """Visualize the calculation.
 
+        If index is not None, only that image is read from vasprun.xml.
+
         """
         from ase.visualize import view
-        if index is not None:
+        if index is None:
+            return view(list(self.traj))
+        elif self.neb:
             return view(self.traj[index])
         else:
-            return view(self.traj)
+            self.update()
+            return view(self.get_lazy_trajectory()[index])
 
     def describe(self, long=False):
         """Describe the parameters used with docstrings in vasp.validate."""
@@ -9,6 +9,11 @@ queue.nodes = 1
 queue.ppn = 1
 queue.mem = 2GB
 queue.jobname = None
+vasprun.cache_mb = 1000
+vasprun.sidecar = False
+vasprun.lazy_traj = False
+volumetric.cache = False
+db.backend = sqlite
 check for $HOME/.vasprc
 then check for ./.vasprc
 Note that the environment variables VASP_SERIAL and VASP_PARALLEL can
@@ -35,7 +40,12 @@ VASPRC = {'vasp.executable.serial': vs,
           '/opt/kitchingroup/vasp-5.3.5/vdw_kernel.bindat',
           'restart_unconverged': True,
           'validate': True,
-          'handle_exceptions': True
+          'handle_exceptions': True,
+          'vasprun.cache_mb': 1000,
+          'vasprun.sidecar': False,
+          'vasprun.lazy_traj': False,
+          'volumetric.cache': False,
+          'db.backend': 'sqlite'
           }
 
 
@@ -0,0 +1,492 @@
+"""Cached and streaming access to vasprun.xml.
+
+Parsing vasprun.xml is the most expensive thing most getters do. Rather
+than each getter parsing the file on its own, they all read from one
+parsed tree that is kept on the calculator and reparsed only when the
+file on disk changes.
+
+Trajectories are not read from that tree. Long MD runs can have tens of
+thousands of ionic steps, so they are streamed one step at a time with
+`iter_ionic_steps`. The vasprun.xml of a running job is read with
+`IncrementalVasprun`, which only parses what was appended since the
+last read.
+
+"""
+
+import os
+import numpy as np
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+import vasp
+from vasp import log
+from vasprc import VASPRC
+from monkeypatch import monkeypatch_class
+
+
+def file_key(fname):
+    """Return a (path, size, mtime) tuple identifying fname on disk.
+
+    Returns None if fname does not exist.
+
+    """
+    try:
+        st = os.stat(fname)
+    except OSError:
+        return None
+    return (os.path.abspath(fname), st.st_size, st.st_mtime)
+
+
+def cache_budget():
+    """Return the largest vasprun.xml size in bytes that may be cached.
+
+    This is set by VASPRC['vasprun.cache_mb']. None means no limit.
+
+    """
+    mb = VASPRC.get('vasprun.cache_mb', None)
+    if mb is None or mb == 'None':
+        return None
+    return float(mb) * 1e6
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_vasprun(self):
+    """Return the parsed vasprun.xml as an ElementTree.
+
+    The tree is stored on the calculator with a (path, size, mtime)
+    key, and reused by every getter until vasprun.xml changes on
+    disk. Files larger than VASPRC['vasprun.cache_mb'] are parsed but
+    not kept, so you can bound the memory used by the cache with
+    Vasp.vasprc(**{'vasprun.cache_mb': 100}). A value of 0 disables
+    caching.
+
+    Returns None if there is no vasprun.xml.
+
+    """
+    fname = os.path.join(self.directory, 'vasprun.xml')
+    key = file_key(fname)
+
+    cache = getattr(self, '_vasprun_cache', None)
+    if key is None:
+        self._vasprun_cache = None
+        return None
+    elif cache is not None and cache[0] == key:
+        return cache[1]
+
+    log.debug('Parsing {}'.format(fname))
+    with open(fname) as f:
+        tree = ElementTree.parse(f)
+
+    budget = cache_budget()
+    if budget is None or key[1] <= budget:
+        self._vasprun_cache = (key, tree)
+    else:
+        log.debug('{} is larger than the cache budget.'.format(fname))
+        self._vasprun_cache = None
+
+    return tree
+
+
+def varray_to_array(varray):
+    """Convert the <v> (or <r>) rows of an element to a 2d np.array.
+
+    All the text is joined and converted in one call rather than one
+    float at a time.
+
+    """
+    text = ' '.join([v.text for v in varray])
+    return np.array(text.split(), dtype=float).reshape(len(varray), -1)
+
+
+def read_eigenvalues(tree):
+    """Return (eigenvalues, occupations) from a parsed vasprun.xml.
+
+    Both arrays have the shape (nspin, nkpts, nbands).
+
+    """
+    spins = tree.find('calculation/eigenvalues/array/set')
+
+    nspin = len(spins)
+    nkpts = len(spins[0])
+    nbands = len(spins[0][0])
+
+    # <r> rows are ordered by spin, then kpoint, then band.
+    data = varray_to_array(list(spins.iter('r')))
+    data = data.reshape(nspin, nkpts, nbands, 2)
+    return data[..., 0], data[..., 1]
+
+
+def read_total_dos(tree):
+    """Return the total DOS from a parsed vasprun.xml.
+
+    :returns: (energies, dos) where dos has the shape (nspin, nE).
+
+    """
+    spins = tree.find('calculation/dos/total/array/set')
+    nspin = len(spins)
+    nE = len(spins[0])
+
+    # each row is energy, total, integrated
+    data = varray_to_array(list(spins.iter('r')))
+    data = data.reshape(nspin, nE, 3)
+    return data[0, :, 0], data[..., 1]
+
+
+def read_pdos(tree):
+    """Return the projected DOS from a parsed vasprun.xml.
+
+    :returns: (energies, pdos, orbitals). energies has the shape
+              (nE,), pdos has the shape (nions, nspin, nE, norbitals)
+              with the ions in VASP order, and orbitals is the list of
+              channel labels, e.g. ['s', 'p', 'd'] for LORBIT=10 or
+              ['s', 'py', 'pz', 'px', 'dxy', ...] for LORBIT=11/12.
+
+    """
+    partial = tree.find('calculation/dos/partial/array')
+    if partial is None:
+        raise Exception('No projected DOS found. Did you set LORBIT?')
+
+    # the first field is the energy
+    orbitals = [f.text.strip() for f in partial.findall('field')][1:]
+
+    ions = partial.find('set')
+    nions = len(ions)
+    nspin = len(ions[0])
+    nE = len(ions[0][0])
+
+    # <r> rows are ordered by ion, then spin, then energy.
+    data = varray_to_array(list(ions.iter('r')))
+    data = data.reshape(nions, nspin, nE, len(orbitals) + 1)
+    return data[0, 0, :, 0], data[..., 1:], orbitals
+
+
+def orbital_l(label):
+    """Return the angular momentum (s, p, d or f) of an orbital label."""
+    if label.startswith('x2'):
+        # the d_{x^2-y^2} channel is labelled x2-y2
+        return 'd'
+    return label[0]
+
+
+def parse_calculation(calculation):
+    """Return a dictionary of results from a <calculation> element.
+
+    The keys are cell, scaled_positions, forces, stress, energy and
+    free_energy. Forces and stress are None when they were not
+    computed. The stress is in ase units and Voigt order.
+
+    """
+    from ase.units import GPa
+
+    # VASP writes a wrong e_0_energy in calculation/energy, so we
+    # correct e_fr_energy with the difference from the last scstep,
+    # the same way ase.io does.
+    lastscf = calculation.findall('scstep/energy')[-1]
+    de = (float(lastscf.find("i[@name='e_0_energy']").text) -
+          float(lastscf.find("i[@name='e_fr_energy']").text))
+    free_energy = float(calculation.find("energy/i[@name='e_fr_energy']")
+                        .text)
+
+    step = {'energy': free_energy + de,
+            'free_energy': free_energy,
+            'forces': None,
+            'stress': None}
+
+    structure = calculation.find('structure')
+    step['cell'] = varray_to_array(
+        structure.find("crystal/varray[@name='basis']"))
+    step['scaled_positions'] = varray_to_array(
+        structure.find("varray[@name='positions']"))
+
+    forces = calculation.find("varray[@name='forces']")
+    if forces is not None:
+        step['forces'] = varray_to_array(forces)
+
+    stress = calculation.find("varray[@name='stress']")
+    if stress is not None:
+        stress = varray_to_array(stress) * -0.1 * GPa
+        step['stress'] = stress.reshape(9)[[0, 4, 8, 5, 2, 1]]
+
+    return step
+
+
+def iter_ionic_steps(fname):
+    """Yield the results of each ionic step in the vasprun.xml fname.
+
+    This streams through the file with iterparse, and each element is
+    freed once it has been used, so memory does not grow with the
+    number of steps. Each step is a dictionary from
+    `parse_calculation` with the chemical symbols (in VASP order)
+    added under symbols.
+
+    A truncated file, e.g. from a running job, ends the iteration
+    after the last complete step.
+
+    """
+    symbols = None
+    root = None
+    depth = 0
+
+    try:
+        for event, elem in ElementTree.iterparse(fname,
+                                                 events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+
+            depth -= 1
+            if elem.tag == 'atominfo':
+                symbols = [rc.find('c').text.strip() for rc in
+                           elem.find("array[@name='atoms']/set")]
+            elif elem.tag == 'calculation' and depth == 1:
+                step = parse_calculation(elem)
+                step['symbols'] = symbols
+                yield step
+
+            # Everything directly under <modeling> is done with now.
+            if depth == 1:
+                root.clear()
+    except ElementTree.ParseError:
+        log.debug('{} is truncated.'.format(fname))
+
+
+def scan_blocks(f, tag, offset=0, count=None, chunk_size=2 ** 24):
+    """Return the byte offsets of the complete <tag> blocks in f.
+
+    The file object f (opened in binary mode) is scanned in chunks
+    from offset, without parsing any XML. Returns a list of (start,
+    end) offsets such that f.read(end - start) at start is the whole
+    block. A block that is not closed yet is ignored. If count is not
+    None, scanning stops after count blocks.
+
+    """
+    open_tag, close_tag = '<{}>'.format(tag), '</{}>'.format(tag)
+    keep = len(close_tag) - 1
+
+    blocks = []
+    f.seek(offset)
+    pos, buf, start = offset, '', None
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        buf += data
+        i = 0
+        while True:
+            if start is None:
+                k = buf.find(open_tag, i)
+                if k == -1:
+                    break
+                start = pos + k
+                i = k + len(open_tag)
+            else:
+                k = buf.find(close_tag, i)
+                if k == -1:
+                    break
+                i = k + len(close_tag)
+                blocks.append((start, pos + i))
+                start = None
+                if count is not None and len(blocks) == count:
+                    return blocks
+        # keep a tail so tags split between chunks are still found
+        i = max(i, len(buf) - keep)
+        pos, buf = pos + i, buf[i:]
+    return blocks
+
+
+def parse_block(f, block):
+    """Parse the (start, end) block of the binary file object f."""
+    start, end = block
+    f.seek(start)
+    header = '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+    return ElementTree.fromstring(header + f.read(end - start))
+
+
+def read_symbols(f):
+    """Return the chemical symbols in <atominfo> of a vasprun.xml.
+
+    Returns None if <atominfo> has not been written yet.
+
+    """
+    blocks = scan_blocks(f, 'atominfo', count=1, chunk_size=2 ** 16)
+    if not blocks:
+        return None
+    atominfo = parse_block(f, blocks[0])
+    return [rc.find('c').text.strip() for rc in
+            atominfo.find("array[@name='atoms']/set")]
+
+
+def step_to_atoms(step, resort=None, constraints=None):
+    """Return an Atoms object for a step from `parse_calculation`.
+
+    The atoms are reordered with resort if it is not None, get a copy
+    of constraints, and have a SinglePointCalculator with the energy,
+    forces and stress of the step.
+
+    """
+    import ase
+    from ase.calculators.singlepoint import SinglePointCalculator as SPC
+
+    atoms = ase.Atoms(step['symbols'],
+                      cell=step['cell'],
+                      scaled_positions=step['scaled_positions'],
+                      pbc=True)
+    forces = step['forces']
+    if resort is not None:
+        atoms = atoms[resort]
+        if forces is not None:
+            forces = forces[resort]
+    if constraints is not None:
+        atoms.set_constraint([c.copy() for c in constraints])
+    atoms.set_calculator(SPC(atoms,
+                             energy=step['energy'],
+                             forces=forces,
+                             stress=step['stress']))
+    return atoms
+
+
+class IncrementalVasprun(object):
+    """Read the ionic steps of a vasprun.xml that is still being written.
+
+    A running job leaves vasprun.xml unclosed, so it cannot be parsed
+    as a whole. Each call to `update` scans only the bytes appended
+    since the last call, parses every complete <calculation> block in
+    them, and remembers the offset just after the last one. Polling a
+    long run therefore costs time proportional to the new output, not
+    to the file size.
+
+    The steps are dictionaries from `parse_calculation`, in VASP order.
+
+    """
+    def __init__(self, fname):
+        self.fname = fname
+        self.reset()
+
+    def reset(self):
+        """Forget everything read so far."""
+        self.offset = 0
+        self.symbols = None
+        self.steps = []
+
+    def update(self):
+        """Read new complete steps. Returns the list of new steps."""
+        if not os.path.exists(self.fname):
+            self.reset()
+            return []
+
+        if os.path.getsize(self.fname) < self.offset:
+            # The file was replaced, e.g. the job was restarted.
+            self.reset()
+
+        new = []
+        with open(self.fname, 'rb') as f:
+            if self.symbols is None:
+                self.symbols = read_symbols(f)
+                if self.symbols is None:
+                    return []
+
+            for block in scan_blocks(f, 'calculation', self.offset):
+                step = parse_calculation(parse_block(f, block))
+                step['symbols'] = self.symbols
+                new.append(step)
+                self.offset = block[1]
+
+        self.steps += new
+        return new
+
+
+class VasprunTrajectory(object):
+    """A lazy, indexable list of the ionic steps in a vasprun.xml.
+
+    Creating one only scans the file for the byte offsets of the
+    <calculation> blocks. A frame is parsed when it is indexed, so
+    traj[-1] or traj[::100] decode just the frames asked for. Frames
+    are returned as Atoms from `step_to_atoms`. Slices return lists.
+
+    """
+    def __init__(self, fname, resort=None, constraints=None):
+        self.fname = fname
+        self.resort = resort
+        self.constraints = constraints
+        with open(fname, 'rb') as f:
+            self.symbols = read_symbols(f)
+            self.blocks = scan_blocks(f, 'calculation')
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('trajectory index out of range')
+
+        with open(self.fname, 'rb') as f:
+            step = parse_calculation(parse_block(f, self.blocks[index]))
+        step['symbols'] = self.symbols
+        return step_to_atoms(step, self.resort, self.constraints)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_lazy_trajectory(self):
+    """Return a `VasprunTrajectory` for vasprun.xml.
+
+    The offset index is kept on the calculator until vasprun.xml
+    changes, so repeated calls do not rescan the file.
+
+    """
+    fname = os.path.join(self.directory, 'vasprun.xml')
+    key = file_key(fname)
+    cache = getattr(self, '_lazy_trajectory', None)
+    if cache is not None and cache[0] == key:
+        return cache[1]
+
+    traj = VasprunTrajectory(fname, self.resort,
+                             self.get_atoms().constraints)
+    self._lazy_trajectory = (key, traj)
+    return traj
+
+
+@monkeypatch_class(vasp.Vasp)
+def get_ionic_steps(self):
+    """Return the ionic steps completed so far in vasprun.xml.
+
+    This works while the calculation is still running, and does not
+    trigger a calculation. The reader is kept on the calculator, so
+    calling this repeatedly only parses the steps written since the
+    last call.
+
+    Each step is a dictionary with the keys energy, free_energy,
+    forces, stress, cell, scaled_positions and symbols. Forces,
+    positions and symbols are in the same order as self.atoms. Forces
+    and stress are None when they were not computed.
+
+    """
+    fname = os.path.join(self.directory, 'vasprun.xml')
+    reader = getattr(self, '_incremental_vasprun', None)
+    if reader is None or reader.fname != fname:
+        reader = IncrementalVasprun(fname)
+        self._incremental_vasprun = reader
+    reader.update()
+
+    steps = []
+    for step in reader.steps:
+        step = dict(step)
+        if self.resort is not None:
+            step['scaled_positions'] = step['scaled_positions'][self.resort]
+            step['symbols'] = [step['symbols'][i] for i in self.resort]
+            if step['forces'] is not None:
+                step['forces'] = step['forces'][self.resort]
+        steps.append(step)
+    return steps
@@ -1,6 +1,7 @@
 '''module for vibrational calculations in jasp'''
 
 import os
+from bisect import bisect_left
 import numpy as np
 import vasp
 from vasp import log
@@ -49,17 +50,15 @@ def get_vibrational_modes(self,
     self.update()
 
     atoms = self.get_atoms()
+    index = self.get_outcar_index()
 
     if hasattr(atoms, 'constraints') and self.parameters['ibrion'] >= 5:
-        # count how many modes to get.
-        NMODES = 0
-        f = open(os.path.join(self.directory, 'OUTCAR'))
-        for line in f:
-            if ('f' in line and 'THz' in line and 'cm-1' in line):
-                NMODES += 1
-            elif 'Eigenvectors after division' in line:
-                break
-        f.close()
+        # count how many modes to get, i.e. the frequency lines before
+        # the sqrt(mass) weighted vectors.
+        if index['sqrt_mass']:
+            NMODES = bisect_left(index['frequency'], index['sqrt_mass'][0])
+        else:
+            NMODES = len(index['frequency'])
     else:
         NMODES = 3 * len(atoms)
 
@@ -69,12 +68,9 @@ def get_vibrational_modes(self,
     # vectors always come first. if nwrite=3, then there are
     # sqrt(mass) weighted vectors that follow this section
 
-    f = open(os.path.join(self.directory, 'OUTCAR'), 'r')
-    while True:
-        line = f.readline()
-        if line.startswith(' Eigenvectors and eigenvalues'
-                           ' of the dynamical matrix'):
-            break
+    f = open(self.outcar, 'r')
+    f.seek(index['eigenvectors'][0])
+    f.readline()   # the header
     f.readline()   # skip ------
     f.readline()   # skip two blank lines
     f.readline()
@@ -167,12 +163,10 @@ def get_vibrational_frequencies(self):
 
     frequencies = []
 
-    f = open(os.path.join(self.directory, 'OUTCAR'), 'r')
-    while True:
-        line = f.readline()
-        if line.startswith(' Eigenvectors and eigenvalues'
-                           ' of the dynamical matrix'):
-            break
+    index = self.get_outcar_index()
+    f = open(self.outcar, 'r')
+    f.seek(index['eigenvectors'][0])
+    f.readline()  # the header
     f.readline()  # skip ------
     f.readline()  # skip two blank lines
     f.readline()
@@ -216,27 +210,21 @@ def get_infrared_intensities(self):
     NIONS = len(atoms)
     BORN_NROWS = NIONS * 4 + 1
 
-    with open(os.path.join(self.directory, 'OUTCAR'), 'r') as f:
-        alltext = f.read()
-        f.seek(0)
-        alllines = f.readlines()
-        f.close()
+    index = self.get_outcar_index()
 
-    if 'BORN' not in alltext:
+    if not index['born']:
         raise Exception('Born effective charges missing. '
                         'Did you use IBRION=7 or 8?')
 
-    if 'Eigenvectors after division by SQRT(mass)' not in alltext:
+    if not index['sqrt_mass']:
         raise Exception('You must rerun with NWRITE=3 to get '
                         'sqrt(mass) weighted eigenvectors')
 
     # get the Born charges
-    for i, line in enumerate(alllines):
-        if 'BORN EFFECTIVE CHARGES' in line:
-            break
+    alllines = index.readlines(index['born'][0], 3 + 4 * NIONS)
 
     BORN_MATRICES = []
-    i += 2  # skip a line
+    i = 2  # skip a line
     for j in range(NIONS):
         BM = []
         i += 1  # skips the ion count line
@@ -256,23 +244,17 @@ def get_infrared_intensities(self):
     # tell.
 
     # the next code in the shell script just copies code to eigenvectors.txt
-    for i, line in enumerate(alllines):
-        if 'Eigenvectors after division by SQRT(mass)' in line:
-            break
-
-    EIG_NVIBS = 0
-    for line in alllines[i:]:
-        if ('f' in line
-            and 'THz' in line
-            and 'cm-1' in line):
-            EIG_NVIBS += 1
+    start = index['sqrt_mass'][0]
+    EIG_NVIBS = (len(index['frequency'])
+                 - bisect_left(index['frequency'], start))
 
     EIG_NIONS = BORN_NROWS
     # I guess this counts blank rows and non-data rows
     # EIG_NROWS = (EIG_NIONS + 3) * EIG_NVIBS + 3
 
     # i is where the data starts
-    i += 6
+    alllines = index.readlines(start, 6 + EIG_NVIBS * (NIONS + 3))
+    i = 6
 
     EIGENVALUES = []
     EIGENVECTORS = []
@@ -0,0 +1,270 @@
+"""Reading volumetric data files (CHG, CHGCAR, LOCPOT, ELFCAR, AECCAR*).
+
+Set VASPRC['volumetric.cache'] = True and the first time a volumetric
+file is read, the grid data is also saved as a binary FILE.npy with a
+small FILE.npy.json header next to it. Later reads memory-map the .npy
+file instead of parsing the text, so only the pages you actually use
+are read. The cache is ignored when FILE changes. The magnetization
+density of spin-polarized files is cached in FILE.magnetization.npy.
+
+combine adds and subtracts volumetric files a slab at a time, e.g. for
+the reference density of Bader analysis (AECCAR0 + AECCAR2), or charge
+density differences (AB - A - B), without reading whole grids.
+
+"""
+
+import os
+import json
+import numpy as np
+
+from vasp import log
+from vasprc import VASPRC
+from VaspChargeDensity import VaspChargeDensity, write_values, iter_slabs
+
+
+def cache_enabled():
+    """Return True if VASPRC['volumetric.cache'] is set."""
+    return VASPRC.get('volumetric.cache', False) in [True, 'True', 'true',
+                                                     '1']
+
+
+def source_key(filename):
+    """Return [size, mtime] of filename."""
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime]
+
+
+def cache_name(filename, component='total'):
+    """Return the name of the cache file of component in filename."""
+    if component == 'total':
+        return filename + '.npy'
+    return '{}.{}.npy'.format(filename, component)
+
+
+def read_cache(filename, component='total'):
+    """Return the memory-mapped cache of filename, or None.
+
+    None is returned when there is no cache, or it is out of date. The
+    array is mapped copy-on-write, so changing it does not change the
+    cache.
+
+    """
+    header = cache_name(filename, component) + '.json'
+    if not os.path.exists(header):
+        return None
+
+    with open(header) as f:
+        d = json.load(f)
+    if d.get('source') != source_key(filename):
+        log.debug('{} is out of date.'.format(header))
+        return None
+
+    return np.load(cache_name(filename, component), mmap_mode='c')
+
+
+def write_cache(filename, data, component='total'):
+    """Save data as the cache of filename.
+
+    The .npy file is written before its header, so a header always
+    describes a complete cache. Directories we cannot write to are
+    skipped.
+
+    """
+    header = {'source': source_key(filename),
+              'shape': data.shape,
+              'dtype': str(data.dtype)}
+    fname = cache_name(filename, component)
+    try:
+        with open(fname + '.tmp', 'wb') as f:
+            np.save(f, data)
+        os.rename(fname + '.tmp', fname)
+
+        with open(fname + '.json.tmp', 'w') as f:
+            json.dump(header, f)
+        os.rename(fname + '.json.tmp', fname + '.json')
+    except (IOError, OSError), e:
+        log.debug('Could not cache {}: {}'.format(filename, e))
+
+
+def read_volumetric(filename, images=None, component='total', dtype=float,
+                    stride=1):
+    """Return the grid data in filename.
+
+    This is np.array(VaspChargeDensity(filename).chg), i.e. one grid
+    per image with the shape (nimages, n0, n1, n2), divided by the
+    cell volume. component='magnetization' returns the chgdiff grids
+    of a spin-polarized file instead.
+
+    images is a list of the images to return, and None returns all of
+    them. Other images are skipped, and not parsed. dtype and stride
+    are passed to VaspChargeDensity, e.g. dtype=np.float32 and
+    stride=2 use 1/16 of the memory.
+
+    The data comes from the binary cache when that is enabled and up
+    to date. The cache always holds every image.
+
+    """
+    if cache_enabled():
+        data = read_cache(filename, component)
+        if data is None:
+            vcd = VaspChargeDensity(filename, components=[component])
+            data = np.array(vcd.chgdiff if component == 'magnetization'
+                            else vcd.chg)
+            write_cache(filename, data, component)
+        if images is not None:
+            data = data[list(images)]
+        if stride > 1:
+            data = data[:, ::stride, ::stride, ::stride]
+        return data.astype(dtype, copy=False)
+
+    vcd = VaspChargeDensity(filename, images, [component], dtype, stride)
+    return np.array(vcd.chgdiff if component == 'magnetization'
+                    else vcd.chg)
+
+
+def grid_moments(data, cell):
+    """Return the integral and first moment of data on a grid in cell.
+
+    data[i, j, k] is at the fractional coordinates (i/n0, j/n1, k/n2).
+    The first moment is computed from the sums of data over the planes
+    perpendicular to each axis and the 1-D fractional axes, so no
+    coordinate grids are made.
+
+    Returns (total, moment), where total is sum(data) * dV and moment
+    is the Cartesian vector sum(data * r) * dV, with dV the volume of
+    a voxel.
+
+    """
+    n0, n1, n2 = data.shape
+    dV = abs(np.linalg.det(cell)) / data.size
+
+    # sums over planes perpendicular to each axis
+    p01 = data.sum(axis=2)
+    planes = [p01.sum(axis=1), p01.sum(axis=0), data.sum(axis=(0, 1))]
+
+    scaled = np.array([np.dot(np.arange(n) / float(n), p)
+                       for n, p in zip(data.shape, planes)])
+    return planes[0].sum() * dV, np.dot(scaled, cell) * dV
+
+
+def read_header(f):
+    """Read the header of the first grid in the open file f.
+
+    Returns (atoms, shape, text), where text is the header as it is in
+    the file. The file is left at the first value of the grid.
+
+    """
+    import ase.io.vasp as aiv
+    atoms = aiv.read_vasp(f)
+    f.readline()
+    shape = tuple(int(x) for x in f.readline().split())
+    end = f.tell()
+    f.seek(0)
+    text = f.read(end)
+    return atoms, shape, text
+
+
+def combine(filenames, coefficients, output, format='chgcar',
+            chunk_size=2 ** 20):
+    """Write the sum of coefficients times the grids in filenames.
+
+    The files are read, added and written in slabs of about chunk_size
+    values, so the grids are never in memory. The header of the first
+    file is used for output. All files must have the same grid and
+    cell.
+
+    Only the first grid in each file is used, i.e. the total density of
+    a CHGCAR. Augmentation charges are not written. For example, the
+    reference density for Bader analysis is
+
+    combine(['AECCAR0', 'AECCAR2'], [1, 1], 'CHGCAR_sum')
+
+    """
+    files = [open(fname) for fname in filenames]
+    try:
+        headers = [read_header(f) for f in files]
+        atoms, shape, text = headers[0]
+        for fname, header in zip(filenames[1:], headers[1:]):
+            if header[1] != shape:
+                raise Exception('{} has a {} grid, but {} has a {} grid.'
+                                .format(fname, header[1],
+                                        filenames[0], shape))
+            if not np.allclose(header[0].get_cell(), atoms.get_cell()):
+                raise Exception('{} and {} have different cells.'
+                                .format(fname, filenames[0]))
+
+        slabs = [iter_slabs(f, shape, chunk_size) for f in files]
+
+        def chunks():
+            for values in zip(*slabs):
+                yield sum(c * v for c, v in zip(coefficients, values))
+
+        tmp = output + '.tmp'
+        try:
+            with open(tmp, 'w') as out:
+                out.write(text)
+                write_values(out, chunks(), format)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        os.rename(tmp, output)
+    finally:
+        for f in files:
+            f.close()
+
+
+def planar_average(filename, axis=2, chunk_size=2 ** 20):
+    """Return the average of the first grid in filename over planes.
+
+    The planes are the lattice planes perpendicular to the lattice
+    vector axis. The grid is read a slab at a time and only the sums
+    are kept.
+
+    The values are as they are in the file, i.e. the potential in eV
+    for LOCPOT, and the density times the cell volume for CHG files.
+
+    Returns (x, average), where x is the distance of each plane from
+    the origin, along the normal of the planes.
+
+    """
+    with open(filename) as f:
+        atoms, shape, text = read_header(f)
+        n0, n1, n2 = shape
+        total = np.zeros(shape[axis])
+        zz = 0
+        for values in iter_slabs(f, shape, chunk_size):
+            # (z, y, x), because x is the fastest index in the file
+            slab = values.reshape((-1, n1, n0))
+            if axis == 0:
+                total += slab.sum(axis=(0, 1))
+            elif axis == 1:
+                total += slab.sum(axis=(0, 2))
+            else:
+                total[zz:zz + len(slab)] = slab.sum(axis=(1, 2))
+            zz += len(slab)
+
+    cell = atoms.get_cell()
+    a, b = [cell[i] for i in range(3) if i != axis]
+    height = atoms.get_volume() / np.linalg.norm(np.cross(a, b))
+    x = np.arange(shape[axis]) * height / shape[axis]
+    return x, total * shape[axis] / (n0 * n1 * n2)
+
+
+def macroscopic_average(x, average, width):
+    """Return the running average of a periodic planar average.
+
+    The average is over a window of width, in the units of x. Use the
+    period of the oscillations in the bulk, e.g. the interlayer
+    distance, to remove them.
+
+    """
+    n = len(average)
+    m = int(round(width / (x[1] - x[0])))
+    if m <= 1:
+        return np.array(average)
+    # wrap around, since the data is periodic
+    padded = np.concatenate([average[-m:], average, average[:m]])
+    return np.convolve(padded, np.ones(m) / m, 'same')[m:m + n]
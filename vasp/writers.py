@@ -10,6 +10,7 @@ import os
 import numpy as np
 import vasp
 from monkeypatch import monkeypatch_class
+from metadata import db_file, write_row
 from ase.calculators.calculator import FileIOCalculator
 
 
@@ -43,7 +44,8 @@ def write_db(self,
     the current DB database.
 
     :param fname: The name of the database to collect calculator
-                  information in. Defaults to DB.db in vasp dir.
+                  information in. Defaults to DB.db in vasp dir, or
+                  DB.json with VASPRC['db.backend'] = 'json'.
     :type fname: str
 
     :param atoms: An ASE atoms object to write to the database. If
@@ -76,7 +78,10 @@ def write_db(self,
     from ase.db import connect
 
     if fname is None:
-        fname = os.path.join(self.directory, 'DB.db')
+        fname = db_file(self.directory, write=True)
+
+    # The defaults are shared between calls, so we change copies.
+    keys, data = dict(keys), dict(data)
 
     # Get the atoms object from the calculator
     if atoms is None:
@@ -115,18 +120,6 @@ def write_db(self,
 
     # Only relevant for writing single entry DB file.
     if overwrite:
-
-        if os.path.exists(fname):
-            # Get any current data and keywords.
-            with connect(fname) as db:
-                try:
-                    dbatoms = db.get_atoms(id=1)
-                    data.update(dbatoms.data)
-                    keys.update(dbatoms.key_value_pairs)
-                except AttributeError:
-                    pass
-            os.unlink(fname)
-
         # Remove keys and data in del_info.
         for k in del_info:
             if k in keys:
@@ -134,9 +127,58 @@ def write_db(self,
             if k in data:
                 del data[k]
 
+        # Row 1 is replaced in place, so the file is never missing
+        # for a concurrent reader.
+        write_row(fname, atoms, keys, data)
+        self._forget_db()
+        return
+
     # Generate the db file
     with connect(fname) as db:
         db.write(atoms, key_value_pairs=keys, data=data)
+    self._forget_db()
+
+
+@monkeypatch_class(vasp.Vasp)
+def _forget_db(self):
+    """Drop the cached DB row and memoized state after writing the DB.
+
+    The file keys they are cached on can miss a change made within the
+    mtime resolution of the filesystem.
+
+    """
+    self._db_row = None
+    vasp.Vasp._state_cache.pop(os.path.abspath(self.directory), None)
+
+
+@monkeypatch_class(vasp.Vasp)
+def update_db(self, keys={}, data={}, delete=[], fname=None):
+    """Update the key_value_pairs and data of row 1 of the database.
+
+    Use this to record a few values, e.g. a jobid or a memory
+    estimate. Everything else in the row is kept. All the changes are
+    made at once, so pass everything that changes together in one
+    call.
+
+    :param keys: Key-value-pairs to add or change.
+    :type keys: dict
+
+    :param data: Data to add or change.
+    :type data: dict
+
+    :param delete: Keys to remove from the key_value_pairs and data.
+    :type delete: list
+
+    If there is no row yet, this is the same as write_db.
+
+    """
+    if fname is None:
+        fname = db_file(self.directory, write=True)
+
+    if write_row(fname, None, keys, data, delete):
+        self._forget_db()
+    else:
+        self.write_db(fname=fname, keys=keys, data=data, del_info=delete)
 
 
 @monkeypatch_class(vasp.Vasp)